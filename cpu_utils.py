@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+CPU helpers shared by the training scripts
+"""
+
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def physical_cores():
+    """Physical core count; SMT siblings only contend for the same ports in tree building"""
+    cores = psutil.cpu_count(logical=False) if psutil else None
+    return cores or os.cpu_count() or 1
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+SQLite helpers shared by the data collection and training scripts
+"""
+
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# Applied to every connection: WAL lets readers and the collectors run side by
+# side, mmap avoids read() syscalls, and a 64 MB page cache keeps OHLCV hot
+# across per-symbol queries.
+PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+    PRAGMA temp_store=MEMORY;
+"""
+
+
+def open_db(path):
+    """Open a SQLite connection tuned for bulk OHLCV reads"""
+    conn = sqlite3.connect(path)
+    conn.executescript(PRAGMAS)
+    return conn
+
+
+def _to_float_array(values):
+    """float64 array from a column of SQLite values; unparseable entries become NaN"""
+    try:
+        return np.fromiter(values, dtype=np.float64, count=len(values))
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def fetch_columns(conn, query, params=()):
+    """Run a query and return {column: float64 array}, skipping DataFrame row building"""
+    cur = conn.execute(query, params)
+    names = [d[0] for d in cur.description]
+    rows = cur.fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: _to_float_array(col) for name, col in zip(names, columns)}
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Parquet cache for loaded/engineered DataFrames
+
+A cached frame is keyed on the modification times of its source files and
+the source code of the functions that build it, so editing either one
+invalidates the cache. Without pyarrow the builder is simply called every time.
+"""
+
+import glob
+import hashlib
+import inspect
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine)
+except ImportError:
+    pyarrow = None
+
+CACHE_DIR = '/opt/binance-bot/cache'
+
+
+def cache_key(sources, code=()):
+    """sha1 over source file mtimes and the code that derives from them"""
+    h = hashlib.sha1()
+    for path in sources:
+        h.update(f'{path}:{os.path.getmtime(path)}'.encode())
+    for obj in code:
+        h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()[:16]
+
+
+def cached_frame(name, sources, builder, code=(), cache_dir=CACHE_DIR):
+    """Return builder() from {cache_dir}/{name}_{key}.parquet, building it on a miss"""
+    if pyarrow is None:
+        return builder()
+    
+    try:
+        path = f'{cache_dir}/{name}_{cache_key(sources, code)}.parquet'
+    except (OSError, TypeError):
+        return builder()
+    
+    if os.path.exists(path):
+        # Memory-map the file so column buffers are decoded straight from the page cache
+        df = pd.read_parquet(path, memory_map=True)
+        print(f"[FeatureCache] Loaded {name} ({len(df)} rows) from {path}", flush=True)
+        return df
+    
+    df = builder()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale in glob.glob(f'{cache_dir}/{name}_*.parquet'):
+            os.remove(stale)
+        df.to_parquet(path, compression='zstd', row_group_size=1 << 16)
+        print(f"[FeatureCache] Saved {name} to {path}", flush=True)
+    except OSError as e:
+        print(f"[FeatureCache] Not caching {name}: {e}", flush=True)
+    return df
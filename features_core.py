@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Feature pipeline shared by the ensemble training scripts
+
+compute_all_features() loads OHLCV/funding/VWAP once and returns a single
+frame with the week1 ensemble columns and the normalized inputs of the week2
+LSTM. Both scripts (and week3, through them) select their columns from it,
+and the frame is stored as one Parquet artifact via feature_cache.
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+
+import indicators
+from indicators import TECHNICAL_COLUMNS, sma, technical_indicators
+from feature_cache import cached_frame
+from train_enhanced_ppo import CDDDataLoader, join_on_unix
+
+# Model inputs of the week1 Random Forest / XGBoost, in training order
+ENSEMBLE_COLUMNS = (
+    ['open', 'high', 'low', 'close', 'volume']
+    + TECHNICAL_COLUMNS
+    + ['funding_rate', 'funding_trend', 'vwap', 'vwap_deviation']
+)
+
+
+def calculate_technical_indicators(df):
+    """Calculate technical indicators
+    
+    RSI, MACD, Bollinger Bands, SMAs/EMAs, momentum, volume ratio and ATR
+    all come from one fused pass over the bars (see TECHNICAL_COLUMNS).
+    """
+    
+    out = technical_indicators(
+        df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64),
+        df['close'].to_numpy(dtype=np.float64),
+        df['volume'].to_numpy(dtype=np.float64)
+    )
+    df[TECHNICAL_COLUMNS] = out
+    
+    return df
+
+
+def add_cdd_features(df, funding_df, vwap_df):
+    """Add CryptoDataDownload features"""
+    
+    # Funding rate features
+    if len(funding_df) > 0:
+        # Merge funding rates
+        funding = join_on_unix(df['unix'], funding_df, 'last_funding_rate')
+        df['funding_rate'] = np.where(np.isnan(funding), 0.0, funding)
+        df['funding_trend'] = df['funding_rate'].rolling(window=8).mean()
+    else:
+        df['funding_rate'] = 0
+        df['funding_trend'] = 0
+    
+    # VWAP features
+    if len(vwap_df) > 0:
+        vwap = join_on_unix(df['unix'], vwap_df, 'vwap')
+        df['vwap'] = np.where(np.isnan(vwap), df['close'], vwap)
+        df['vwap_deviation'] = (df['close'] - df['vwap']) / df['vwap']
+    else:
+        df['vwap'] = df['close']
+        df['vwap_deviation'] = 0
+    
+    return df
+
+
+def add_sequence_features(df):
+    """Normalized per-bar features the LSTM reads (price/volume changes, MA and RSI ratios)
+    
+    The 10-bar volume average/ratio are stored as volume_ma_10/volume_ratio_10,
+    since volume_ratio is already the 20-bar ensemble column.
+    """
+    
+    # Price features (normalized)
+    df['price_change'] = df['close'].pct_change()
+    df['high_low_range'] = (df['high'] - df['low']) / df['close']
+    df['close_open_change'] = (df['close'] - df['open']) / df['open']
+    
+    close = df['close'].to_numpy(dtype=np.float64)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    
+    # Volume features
+    df['volume_change'] = df['volume'].pct_change()
+    df['volume_ma_10'] = sma(volume, 10)
+    df['volume_ratio_10'] = df['volume'] / (df['volume_ma_10'] + 1e-10)
+    
+    # MA ratios from float64 averages; close/sma - 1 cancels most of the
+    # digits, so the float32 indicator columns are not precise enough here
+    for period in [5, 10, 20]:
+        df[f'price_sma{period}_ratio'] = close / (sma(close, period) + 1e-10) - 1
+    
+    # RSI normalized to [-1, 1]
+    df['rsi_normalized'] = (df['rsi'] - 50) / 50
+    
+    return df
+
+
+def _build_all_features(loader, symbol, days):
+    """Load the raw tables and run every feature step"""
+    
+    print(f"[Features] Loading data for {symbol} ({days} days)...")
+    
+    # Raw tables are cached too and shared with the PPO trainer
+    ohlcv_df = loader.load_cached('load_ohlcv', symbol, days)
+    funding_df = loader.load_cached('load_funding_rates', symbol)
+    vwap_df = loader.load_cached('load_vwap', symbol)
+    loader.close()
+    
+    print(f"[Features] Loaded {len(ohlcv_df)} OHLCV records")
+    
+    # Convert to numeric
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        ohlcv_df[col] = pd.to_numeric(ohlcv_df[col], errors='coerce')
+    
+    print(f"[Features] Calculating technical indicators...")
+    df = calculate_technical_indicators(ohlcv_df)
+    
+    print(f"[Features] Adding CDD features...")
+    df = add_cdd_features(df, funding_df, vwap_df)
+    
+    print(f"[Features] Adding sequence features...")
+    return add_sequence_features(df)
+
+
+def compute_all_features(symbol='BTCUSDT', days=90, loader=None):
+    """Every engineered feature for symbol, one row per bar (NaN warm-up rows kept)
+    
+    Served from the Parquet cache while the DB and this pipeline's code are
+    unchanged. Callers select their columns and drop NaN rows themselves.
+    """
+    loader = loader or CDDDataLoader()
+    return cached_frame(
+        f'features_{symbol}_{days}', [loader.db_path],
+        lambda: _build_all_features(loader, symbol, days),
+        code=[sys.modules[__name__], CDDDataLoader, join_on_unix, indicators]
+    )
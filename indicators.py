@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Technical indicator kernels shared by the training scripts
+
+Each kernel is a single pass over float64 arrays. They are compiled with
+Numba when it is installed; without it the same loops run as plain Python.
+Rolling kernels follow pandas' rolling(window) semantics: a value is emitted
+only when the last `window` inputs are all non-NaN.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit when Numba is not installed"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+    prange = range
+
+
+@njit(cache=True)
+def ema(x, span):
+    """Exponential moving average, same as pandas ewm(span, adjust=False)
+    
+    NaN inputs carry the previous average forward and, like pandas, decay
+    its weight by (1 - alpha) per missing step.
+    """
+    n = x.shape[0]
+    out = np.empty(n)
+    if n == 0:
+        return out
+    alpha = 2.0 / (span + 1.0)
+    out[0] = x[0]
+    old_wt = 1.0
+    for i in range(1, n):
+        prev = out[i - 1]
+        if np.isnan(prev):
+            out[i] = x[i]
+            continue
+        old_wt *= 1.0 - alpha
+        if np.isnan(x[i]):
+            out[i] = prev
+        else:
+            out[i] = (old_wt * prev + alpha * x[i]) / (old_wt + alpha)
+            old_wt = 1.0
+    return out
+
+
+@njit(cache=True)
+def sma(x, window):
+    """Simple moving average via a running sum"""
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    run = 0
+    total = 0.0
+    for i in range(n):
+        v = x[i]
+        if np.isnan(v):
+            run = 0
+            total = 0.0
+            continue
+        total += v
+        run += 1
+        if run > window:
+            total -= x[i - window]
+        if run >= window:
+            out[i] = total / window
+    return out
+
+
+@njit(cache=True)
+def rolling_mean_std(x, window):
+    """Rolling mean and sample standard deviation (ddof=1) from one sliding Welford pass"""
+    n = x.shape[0]
+    out_mean = np.full(n, np.nan)
+    out_std = np.full(n, np.nan)
+    run = 0
+    mean = 0.0
+    m2 = 0.0
+    for i in range(n):
+        v = x[i]
+        if np.isnan(v):
+            run = 0
+            mean = 0.0
+            m2 = 0.0
+            continue
+        if run < window:
+            run += 1
+            d = v - mean
+            mean += d / run
+            m2 += d * (v - mean)
+        else:
+            old = x[i - window]
+            d = v - old
+            new_mean = mean + d / window
+            m2 += d * (v - new_mean + old - mean)
+            mean = new_mean
+        if run >= window:
+            out_mean[i] = mean
+            out_std[i] = np.sqrt(max(m2, 0.0) / (window - 1))
+    return out_mean, out_std
+
+
+@njit(cache=True)
+def rolling_std(x, window):
+    """Rolling sample standard deviation (ddof=1) with a sliding Welford update"""
+    return rolling_mean_std(x, window)[1]
+
+
+@njit(cache=True)
+def sma_rsi(x, period):
+    """RSI from simple rolling means of gains/losses, as the ensemble scripts use"""
+    n = x.shape[0]
+    gain = np.zeros(n)
+    loss = np.zeros(n)
+    for i in range(1, n):
+        d = x[i] - x[i - 1]
+        if d > 0.0:
+            gain[i] = d
+        elif d < 0.0:
+            loss[i] = -d
+    avg_gain = sma(gain, period)
+    avg_loss = sma(loss, period)
+    out = np.empty(n)
+    for i in range(n):
+        rs = avg_gain[i] / (avg_loss[i] + 1e-10)
+        out[i] = 100.0 - 100.0 / (1.0 + rs)
+    return out
+
+
+@njit(cache=True)
+def _nanmax3(a, b, c):
+    """max() of the non-NaN arguments (NaN if all are), like pandas' skipna max"""
+    m = np.nan
+    if not np.isnan(a):
+        m = a
+    if not np.isnan(b) and (np.isnan(m) or b > m):
+        m = b
+    if not np.isnan(c) and (np.isnan(m) or c > m):
+        m = c
+    return m
+
+
+@njit(cache=True)
+def _true_range(high, low, close, i):
+    """True range of bar i; the first bar has no previous close, so it is high - low"""
+    if i == 0:
+        return high[i] - low[i]
+    return _nanmax3(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+
+
+@njit(cache=True)
+def atr(high, low, close, period):
+    """Average true range as a simple rolling mean of the true range"""
+    n = close.shape[0]
+    tr = np.empty(n)
+    for i in range(n):
+        tr[i] = _true_range(high, low, close, i)
+    return sma(tr, period)
+
+
+@njit(cache=True)
+def _rsi_value(avg_gain, avg_loss):
+    if avg_loss == 0.0:
+        return 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+@njit(cache=True)
+def wilder_rsi(x, period):
+    """RSI with Wilder smoothing; the first `period` values are NaN"""
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if n <= period:
+        return out
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, period + 1):
+        d = x[i] - x[i - 1]
+        if d > 0.0:
+            avg_gain += d
+        else:
+            avg_loss -= d
+    avg_gain /= period
+    avg_loss /= period
+    out[period] = _rsi_value(avg_gain, avg_loss)
+    for i in range(period + 1, n):
+        d = x[i] - x[i - 1]
+        gain = d if d > 0.0 else 0.0
+        loss = -d if d < 0.0 else 0.0
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+        out[i] = _rsi_value(avg_gain, avg_loss)
+    return out
+
+
+# Output columns of technical_indicators(), in feature order
+TECHNICAL_COLUMNS = [
+    'rsi', 'macd', 'macd_signal', 'macd_hist',
+    'bb_upper', 'bb_lower', 'bb_width', 'bb_position',
+    'sma_5', 'sma_10', 'sma_20', 'ema_5', 'ema_10',
+    'momentum_1h', 'momentum_4h', 'momentum_24h',
+    'volume_sma_20', 'volume_ratio', 'atr', 'atr_pct',
+]
+
+
+@njit(cache=True)
+def _ema_step(prev, old_wt, v, alpha):
+    """One step of ema(); returns (value, old_wt)"""
+    if np.isnan(prev):
+        return v, 1.0
+    old_wt *= 1.0 - alpha
+    if np.isnan(v):
+        return prev, old_wt
+    return (old_wt * prev + alpha * v) / (old_wt + alpha), 1.0
+
+
+@njit(cache=True)
+def _sum_step(total, run, v, old, window):
+    """One step of sma(); `old` is the value leaving the window. Returns (total, run, mean)"""
+    if np.isnan(v):
+        return 0.0, 0, np.nan
+    total += v
+    run += 1
+    if run > window:
+        total -= old
+    if run >= window:
+        return total, run, total / window
+    return total, run, np.nan
+
+
+@njit(cache=True)
+def _welford_step(mean, m2, run, v, old, window):
+    """One step of rolling_std(); returns (mean, m2, run, std)"""
+    if np.isnan(v):
+        return 0.0, 0.0, 0, np.nan
+    if run < window:
+        run += 1
+        d = v - mean
+        mean += d / run
+        m2 += d * (v - mean)
+    else:
+        d = v - old
+        new_mean = mean + d / window
+        m2 += d * (v - new_mean + old - mean)
+        mean = new_mean
+    if run >= window:
+        return mean, m2, run, np.sqrt(max(m2, 0.0) / (window - 1))
+    return mean, m2, run, np.nan
+
+
+@njit(cache=True)
+def _gain_loss(close, i):
+    if i == 0:
+        return 0.0, 0.0
+    d = close[i] - close[i - 1]
+    if d > 0.0:
+        return d, 0.0
+    if d < 0.0:
+        return 0.0, -d
+    return 0.0, 0.0
+
+
+@njit(cache=True)
+def technical_indicators(high, low, close, volume):
+    """All TECHNICAL_COLUMNS in one pass over the bars, as an (n, 20) float32 matrix
+    
+    Values match the individual kernels (sma, rolling_std, ema, sma_rsi, atr);
+    every rolling/EWM state is carried in scalars instead of a pass per indicator.
+    """
+    n = close.shape[0]
+    out = np.empty((n, 20), dtype=np.float32)
+    
+    a5, a10, a12, a26, a9 = 2.0 / 6.0, 2.0 / 11.0, 2.0 / 13.0, 2.0 / 27.0, 2.0 / 10.0
+    e5 = e10 = e12 = e26 = sig = np.nan
+    w5 = w10 = w12 = w26 = wsig = 1.0
+    
+    s5 = s10 = s20 = vs20 = g14 = l14 = tr14 = 0.0
+    r5 = r10 = r20 = rv20 = rg14 = rl14 = rtr14 = 0
+    m20 = q20 = 0.0
+    rq20 = 0
+    
+    for i in range(n):
+        c = close[i]
+        
+        # RSI (simple means of gains/losses)
+        g, l = _gain_loss(close, i)
+        og, ol = _gain_loss(close, i - 14) if i >= 14 else (0.0, 0.0)
+        g14, rg14, avg_gain = _sum_step(g14, rg14, g, og, 14)
+        l14, rl14, avg_loss = _sum_step(l14, rl14, l, ol, 14)
+        out[i, 0] = 100.0 - 100.0 / (1.0 + avg_gain / (avg_loss + 1e-10))
+        
+        # MACD
+        e12, w12 = _ema_step(e12, w12, c, a12)
+        e26, w26 = _ema_step(e26, w26, c, a26)
+        macd = e12 - e26
+        sig, wsig = _ema_step(sig, wsig, macd, a9)
+        out[i, 1] = macd
+        out[i, 2] = sig
+        out[i, 3] = macd - sig
+        
+        # Bollinger Bands and moving averages
+        s5, r5, sma5 = _sum_step(s5, r5, c, close[i - 5] if i >= 5 else 0.0, 5)
+        s10, r10, sma10 = _sum_step(s10, r10, c, close[i - 10] if i >= 10 else 0.0, 10)
+        s20, r20, sma20 = _sum_step(s20, r20, c, close[i - 20] if i >= 20 else 0.0, 20)
+        m20, q20, rq20, std20 = _welford_step(m20, q20, rq20, c, close[i - 20] if i >= 20 else 0.0, 20)
+        upper = sma20 + std20 * 2
+        lower = sma20 - std20 * 2
+        out[i, 4] = upper
+        out[i, 5] = lower
+        out[i, 6] = (upper - lower) / sma20
+        out[i, 7] = (c - lower) / (upper - lower + 1e-10)
+        out[i, 8] = sma5
+        out[i, 9] = sma10
+        out[i, 10] = sma20
+        e5, w5 = _ema_step(e5, w5, c, a5)
+        e10, w10 = _ema_step(e10, w10, c, a10)
+        out[i, 11] = e5
+        out[i, 12] = e10
+        
+        # Momentum
+        out[i, 13] = c / close[i - 1] - 1.0 if i >= 1 else np.nan
+        out[i, 14] = c / close[i - 4] - 1.0 if i >= 4 else np.nan
+        out[i, 15] = c / close[i - 24] - 1.0 if i >= 24 else np.nan
+        
+        # Volume
+        v = volume[i]
+        vs20, rv20, vsma20 = _sum_step(vs20, rv20, v, volume[i - 20] if i >= 20 else 0.0, 20)
+        out[i, 16] = vsma20
+        out[i, 17] = v / (vsma20 + 1e-10)
+        
+        # ATR
+        otr = _true_range(high, low, close, i - 14) if i >= 14 else 0.0
+        tr14, rtr14, atr14 = _sum_step(tr14, rtr14, _true_range(high, low, close, i), otr, 14)
+        out[i, 18] = atr14
+        out[i, 19] = atr14 / c
+    
+    return out
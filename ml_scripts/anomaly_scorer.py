@@ -6,8 +6,28 @@ Scores market conditions using trained Isolation Forest
 
 import sys
 import json
+import os
 import numpy as np
 import pickle
+import joblib
+
+# Below this many rows the thread-pool dispatch costs more than scoring itself
+THREADED_MIN_ROWS = 1024
+
+
+def score_batch(model, scaler, X):
+    """Anomaly scores for every row of X in one vectorized call
+    
+    Prefer this over scoring rows one at a time: score_samples is vectorized
+    over rows, and for large batches the threading backend spreads the trees
+    across cores.
+    """
+    X_scaled = scaler.transform(np.asarray(X, dtype=np.float32))
+    if len(X_scaled) < THREADED_MIN_ROWS:
+        return model.score_samples(X_scaled)
+    with joblib.parallel_backend('threading', n_jobs=-1):
+        return model.score_samples(X_scaled)
+
 
 class AnomalyScorer:
     """Score market conditions for anomalies"""
@@ -21,18 +41,22 @@ class AnomalyScorer:
         """Load trained model and scaler"""
         
         try:
-            with open(f'{self.models_dir}/isolation_forest.pkl', 'rb') as f:
-                self.model = pickle.load(f)
-            
-            with open(f'{self.models_dir}/scaler.pkl', 'rb') as f:
-                self.scaler = pickle.load(f)
-            
+            self.model = self._load(f'{self.models_dir}/isolation_forest')
+            self.scaler = self._load(f'{self.models_dir}/scaler')
             return True
             
         except Exception as e:
             print(f"Error loading models: {e}", file=sys.stderr)
             return False
     
+    @staticmethod
+    def _load(path):
+        """Load {path}.joblib, falling back to a {path}.pkl from older training runs"""
+        if os.path.exists(f'{path}.joblib'):
+            return joblib.load(f'{path}.joblib')
+        with open(f'{path}.pkl', 'rb') as f:
+            return pickle.load(f)
+    
     def prepare_features(self, conditions):
         """Prepare features from market conditions"""
         
@@ -60,10 +84,8 @@ class AnomalyScorer:
         # Prepare features
         X = self.prepare_features(conditions)
         
-        # Scale features
+        # Scale features and get anomaly score (one row: no thread pool)
         X_scaled = self.scaler.transform(X)
-        
-        # Get anomaly score
         score = self.model.score_samples(X_scaled)[0]
         
         return {
@@ -8,6 +8,7 @@ import sys
 import json
 import numpy as np
 import pickle
+import joblib
 import os
 
 # Suppress TensorFlow warnings
@@ -29,8 +30,12 @@ class ConfidenceScorer:
         
         try:
             # Load Random Forest
-            with open(f'{self.models_dir}/random_forest.pkl', 'rb') as f:
-                self.rf_model = pickle.load(f)
+            rf_path = f'{self.models_dir}/random_forest.joblib'
+            if os.path.exists(rf_path):
+                self.rf_model = joblib.load(rf_path, mmap_mode='r')
+            else:
+                with open(f'{self.models_dir}/random_forest.pkl', 'rb') as f:
+                    self.rf_model = pickle.load(f)
             
             # Load XGBoost
             import xgboost as xgb
@@ -9,12 +9,16 @@ import numpy as np
 import pandas as pd
 from datetime import datetime
 import json
-import pickle
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 # ML libraries
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import cross_val_score
 from sklearn.metrics import classification_report, accuracy_score
+import joblib
 import xgboost as xgb
 
 # TensorFlow for LSTM
@@ -26,7 +30,24 @@ from tensorflow.keras.layers import LSTM, Dense, Dropout, BatchNormalization
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.optimizers import Adam
 
-import sqlite3
+from cpu_utils import physical_cores
+from db_utils import open_db
+from indicators import atr, rolling_mean_std, sma, sma_rsi
+
+# RF, XGBoost and the LSTM train side by side in their own processes; each one
+# gets an equal share of the physical cores so together they do not oversubscribe
+JOB_THREADS = max(1, physical_cores() // 3)
+
+# The LSTM's ops run one at a time on the LSTM's share of the cores (set at
+# import, so it applies in the spawned worker before TF starts)
+try:
+    tf.config.threading.set_intra_op_parallelism_threads(JOB_THREADS)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+except RuntimeError:
+    pass  # TF runtime already initialized
+
+# One-hot rows for the 3 target classes (DOWN, SIDEWAYS, UP)
+_EYE3 = np.eye(3, dtype=np.float32)
 
 
 class ConsolidatedDataLoader:
@@ -40,7 +61,7 @@ class ConsolidatedDataLoader:
         
         print(f"[Data] Loading from {self.db_path}...")
         
-        conn = sqlite3.connect(self.db_path)
+        conn = open_db(self.db_path)
         
         # Load from deduplicated table
         df = pd.read_sql_query("""
@@ -73,6 +94,11 @@ class FeatureEngineer:
         for col in ['open', 'high', 'low', 'close', 'volume']:
             df[col] = pd.to_numeric(df[col], errors='coerce')
         
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        close = df['close'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        
         # Price features
         df['price_change'] = df['close'].pct_change()
         df['high_low_range'] = (df['high'] - df['low']) / df['close']
@@ -80,49 +106,43 @@ class FeatureEngineer:
         
         # Volume features
         df['volume_change'] = df['volume'].pct_change()
-        df['volume_ma_10'] = df['volume'].rolling(window=10).mean()
+        df['volume_ma_10'] = sma(volume, 10)
         df['volume_ratio'] = df['volume'] / (df['volume_ma_10'] + 1e-10)
         
-        # Moving averages
+        # Every EMA span used below, each computed once
+        emas = {span: df['close'].ewm(span=span).mean() for span in (5, 10, 12, 20, 26)}
+        
+        # Moving averages (sma_20 and the Bollinger std come from one Welford pass)
+        sma_20, std_20 = rolling_mean_std(close, 20)
+        smas = {5: sma(close, 5), 10: sma(close, 10), 20: sma_20}
         for period in [5, 10, 20]:
-            df[f'sma_{period}'] = df['close'].rolling(window=period).mean()
-            df[f'ema_{period}'] = df['close'].ewm(span=period).mean()
+            df[f'sma_{period}'] = smas[period]
+            df[f'ema_{period}'] = emas[period]
         
         # MA ratios
         df['price_sma5_ratio'] = df['close'] / (df['sma_5'] + 1e-10) - 1
         df['price_sma10_ratio'] = df['close'] / (df['sma_10'] + 1e-10) - 1
         df['price_sma20_ratio'] = df['close'] / (df['sma_20'] + 1e-10) - 1
         
-        # Bollinger Bands
-        df['bb_middle'] = df['close'].rolling(window=20).mean()
-        df['bb_std'] = df['close'].rolling(window=20).std()
+        # Bollinger Bands (middle band is sma_20)
+        df['bb_middle'] = sma_20
+        df['bb_std'] = std_20
         df['bb_upper'] = df['bb_middle'] + 2 * df['bb_std']
         df['bb_lower'] = df['bb_middle'] - 2 * df['bb_std']
         df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'] + 1e-10)
         df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['bb_middle']
         
         # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / (loss + 1e-10)
-        df['rsi'] = 100 - (100 / (1 + rs))
+        df['rsi'] = sma_rsi(close, 14)
         df['rsi_normalized'] = (df['rsi'] - 50) / 50
         
         # MACD
-        ema_12 = df['close'].ewm(span=12).mean()
-        ema_26 = df['close'].ewm(span=26).mean()
-        df['macd'] = ema_12 - ema_26
+        df['macd'] = emas[12] - emas[26]
         df['macd_signal'] = df['macd'].ewm(span=9).mean()
         df['macd_hist'] = df['macd'] - df['macd_signal']
         
-        # ATR
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        true_range = ranges.max(axis=1)
-        df['atr'] = true_range.rolling(window=14).mean()
+        # ATR (true range and its 14-bar mean in one kernel pass)
+        df['atr'] = atr(high, low, close, 14)
         df['atr_pct'] = df['atr'] / df['close']
         
         # Momentum
@@ -134,9 +154,12 @@ class FeatureEngineer:
         
         # Classification target (3 classes)
         threshold = 0.001  # 0.1%
-        df['target'] = 1  # SIDEWAYS
-        df.loc[df['future_return'] > threshold, 'target'] = 2  # UP
-        df.loc[df['future_return'] < -threshold, 'target'] = 0  # DOWN
+        future_return = df['future_return']
+        df['target'] = np.select(
+            [future_return > threshold, future_return < -threshold],
+            [2, 0],  # UP, DOWN
+            default=1  # SIDEWAYS
+        ).astype(np.int8)
         
         # Drop NaN
         df = df.dropna()
@@ -160,7 +183,7 @@ def train_random_forest(X_train, y_train, X_val, y_val):
         min_samples_split=20,
         min_samples_leaf=10,
         random_state=42,
-        n_jobs=-1
+        n_jobs=JOB_THREADS
     )
     
     print(f"[RF] Training on {len(X_train)} samples...")
@@ -170,8 +193,18 @@ def train_random_forest(X_train, y_train, X_val, y_val):
     y_pred = model.predict(X_val)
     accuracy = accuracy_score(y_val, y_pred)
     
-    # CV score
-    cv_scores = cross_val_score(model, X_train, y_train, cv=5, n_jobs=-1)
+    # CV score: hand the loky workers a memory-mapped X so they share pages
+    # instead of each unpickling a copy, and keep BLAS single-threaded inside
+    # the workers to avoid nested oversubscription; the folds split the RF's
+    # share of the cores, one single-threaded forest per worker
+    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    with tempfile.TemporaryDirectory(dir=shm_dir) as tmp_dir:
+        mmap_path = os.path.join(tmp_dir, 'X_train.joblib')
+        joblib.dump(X_train, mmap_path)
+        X_mmap = joblib.load(mmap_path, mmap_mode='r')
+        with joblib.parallel_backend('loky', inner_max_num_threads=1):
+            cv_scores = cross_val_score(clone(model).set_params(n_jobs=1), X_mmap, y_train,
+                                        cv=5, n_jobs=min(5, JOB_THREADS))
     
     print(f"\n[RF] Validation Accuracy: {accuracy:.3f}")
     print(f"[RF] CV Accuracy: {cv_scores.mean():.3f} ± {cv_scores.std():.3f}")
@@ -188,22 +221,35 @@ def train_xgboost(X_train, y_train, X_val, y_val):
     print(f"  XGBoost Training")
     print(f"{'='*70}\n")
     
-    model = xgb.XGBClassifier(
-        n_estimators=500,
-        max_depth=6,
-        learning_rate=0.01,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42,
-        n_jobs=-1,
-        early_stopping_rounds=50
-    )
+    params = {
+        'objective': 'multi:softprob',
+        'num_class': 3,
+        'eval_metric': 'mlogloss',
+        'tree_method': 'hist',
+        'max_depth': 6,
+        'learning_rate': 0.01,
+        'subsample': 0.8,
+        'colsample_bytree': 0.8,
+        'seed': 42,
+        'nthread': JOB_THREADS
+    }
+    
+    # Quantize features once; every boosting round reuses the uint8 bin ids
+    dtrain = xgb.QuantileDMatrix(X_train, label=y_train)
+    dval = xgb.QuantileDMatrix(X_val, label=y_val, ref=dtrain)
     
     print(f"[XGB] Training on {len(X_train)} samples...")
-    model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=True)
+    model = xgb.train(
+        params, dtrain,
+        num_boost_round=500,
+        evals=[(dval, 'val')],
+        early_stopping_rounds=50,
+        verbose_eval=True
+    )
     
     # Validation
-    y_pred = model.predict(X_val)
+    y_proba = model.inplace_predict(X_val, iteration_range=(0, model.best_iteration + 1))
+    y_pred = np.argmax(y_proba, axis=1)
     accuracy = accuracy_score(y_val, y_pred)
     
     print(f"\n[XGB] Validation Accuracy: {accuracy:.3f}")
@@ -221,8 +267,8 @@ def train_lstm(X_train, y_train, X_val, y_val, sequence_length=20, n_features=11
     print(f"{'='*70}\n")
     
     model = Sequential([
+        # Back-to-back LSTMs with default args stay on the fused cuDNN kernel
         LSTM(64, return_sequences=True, input_shape=(sequence_length, n_features)),
-        BatchNormalization(),
         Dropout(0.2),
         LSTM(64, return_sequences=False),
         BatchNormalization(),
@@ -261,6 +307,38 @@ def train_lstm(X_train, y_train, X_val, y_val, sequence_length=20, n_features=11
     return model, {'val_accuracy': float(val_accuracy), 'val_loss': float(val_loss)}
 
 
+def fit_and_save_random_forest(X_train, y_train, X_val, y_val, output_dir):
+    """Train and save Random Forest (worker process entry point)"""
+    
+    model, metrics = train_random_forest(X_train, y_train, X_val, y_val)
+    # Uncompressed so the tree arrays can be memory-mapped on load
+    joblib.dump(model, f'{output_dir}/random_forest.joblib')
+    print(f"[RF] 💾 Saved to {output_dir}/random_forest.joblib")
+    
+    return metrics
+
+
+def fit_and_save_xgboost(X_train, y_train, X_val, y_val, output_dir):
+    """Train and save XGBoost (worker process entry point)"""
+    
+    model, metrics = train_xgboost(X_train, y_train, X_val, y_val)
+    model.save_model(f'{output_dir}/xgboost.json')
+    print(f"[XGB] 💾 Saved to {output_dir}/xgboost.json")
+    
+    return metrics
+
+
+def fit_and_save_lstm(X_train, y_train, X_val, y_val, output_dir, sequence_length, n_features):
+    """Train and save LSTM (worker process entry point)"""
+    
+    model, metrics = train_lstm(X_train, y_train, X_val, y_val,
+                                sequence_length=sequence_length, n_features=n_features)
+    model.save(f'{output_dir}/lstm_model.keras')
+    print(f"[LSTM] 💾 Saved to {output_dir}/lstm_model.keras")
+    
+    return metrics
+
+
 def main():
     """Main retraining routine"""
     
@@ -292,17 +370,6 @@ def main():
     
     print(f"\n[Split] Training: {len(X_train)}, Validation: {len(X_val)}")
     
-    # Train Random Forest
-    rf_model, rf_metrics = train_random_forest(X_train, y_train, X_val, y_val)
-    with open(f'{OUTPUT_DIR}/random_forest.pkl', 'wb') as f:
-        pickle.dump(rf_model, f)
-    print(f"[RF] 💾 Saved to {OUTPUT_DIR}/random_forest.pkl")
-    
-    # Train XGBoost  
-    xgb_model, xgb_metrics = train_xgboost(X_train, y_train, X_val, y_val)
-    xgb_model.save_model(f'{OUTPUT_DIR}/xgboost.json')
-    print(f"[XGB] 💾 Saved to {OUTPUT_DIR}/xgboost.json")
-    
     # Prepare LSTM data (sequences)
     print(f"\n[LSTM] Preparing sequence data...")
     sequence_length = 20
@@ -313,20 +380,15 @@ def main():
         'rsi_normalized', 'macd_hist', 'atr_pct'
     ]
     
-    X_seq_list = []
-    y_seq_list = []
-    
-    for i in range(len(df) - sequence_length):
-        seq = df[lstm_feature_cols].iloc[i:i+sequence_length].values
-        target = df['target'].iloc[i+sequence_length]
-        X_seq_list.append(seq)
-        # One-hot encode target
-        target_onehot = [0, 0, 0]
-        target_onehot[int(target)] = 1
-        y_seq_list.append(target_onehot)
+    arr = df[lstm_feature_cols].to_numpy(dtype=np.float32)
+    targets = df['target'].to_numpy(dtype=np.int64)
     
-    X_seq = np.array(X_seq_list)
-    y_seq = np.array(y_seq_list)
+    n_seq = len(df) - sequence_length
+    X_seq = np.empty((n_seq, sequence_length, len(lstm_feature_cols)), dtype=np.float32)
+    for i in range(n_seq):
+        X_seq[i] = arr[i:i+sequence_length]
+    # One-hot encode targets
+    y_seq = _EYE3[targets[sequence_length:]]
     
     # Split
     split_idx_lstm = int(len(X_seq) * 0.8)
@@ -335,11 +397,18 @@ def main():
     
     print(f"[LSTM] Sequences: {len(X_seq)}, Train: {len(X_seq_train)}, Val: {len(X_seq_val)}")
     
-    # Train LSTM
-    lstm_model, lstm_metrics = train_lstm(X_seq_train, y_seq_train, X_seq_val, y_seq_val, 
-                                          sequence_length=sequence_length, n_features=len(lstm_feature_cols))
-    lstm_model.save(f'{OUTPUT_DIR}/lstm_model.keras')
-    print(f"[LSTM] 💾 Saved to {OUTPUT_DIR}/lstm_model.keras")
+    # Train RF, XGB and LSTM concurrently: RF is CPU-bound, XGB and LSTM can
+    # sit on the GPU, so wall time is the slowest model instead of the sum.
+    # 'spawn' keeps children from inheriting a forked TensorFlow/CUDA context.
+    print(f"\n[Train] Launching RF, XGB and LSTM in parallel...")
+    with ProcessPoolExecutor(max_workers=3, mp_context=multiprocessing.get_context('spawn')) as ex:
+        fut_rf = ex.submit(fit_and_save_random_forest, X_train, y_train, X_val, y_val, OUTPUT_DIR)
+        fut_xgb = ex.submit(fit_and_save_xgboost, X_train, y_train, X_val, y_val, OUTPUT_DIR)
+        fut_lstm = ex.submit(fit_and_save_lstm, X_seq_train, y_seq_train, X_seq_val, y_seq_val, OUTPUT_DIR,
+                             sequence_length, len(lstm_feature_cols))
+        rf_metrics = fut_rf.result()
+        xgb_metrics = fut_xgb.result()
+        lstm_metrics = fut_lstm.result()
     
     # Save metadata
     metadata = {
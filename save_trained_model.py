@@ -1,21 +1,32 @@
+import ast
 import sys
 import os
 import json
-import numpy as np
 from datetime import datetime
 
-# Add the training script directory to path
-sys.path.insert(0, '/opt/binance-bot')
+TRAINING_DIR = '/opt/binance-bot'
 
-# Import from training script
-from train_enhanced_ppo import PPOAgent, CONFIG
+def load_config():
+    """Read CONFIG from the training script without importing TensorFlow"""
+    try:
+        with open(f'{TRAINING_DIR}/train_enhanced_ppo.py') as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'CONFIG' for t in node.targets):
+                return ast.literal_eval(node.value)
+    except (OSError, SyntaxError, ValueError):
+        pass
+    
+    # Fall back to importing it; keep TensorFlow quiet and off the GPU
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+    sys.path.insert(0, TRAINING_DIR)
+    from train_enhanced_ppo import CONFIG
+    return CONFIG
 
 def save_model():
-    print('[Save] Creating PPO agent...')
-    agent = PPOAgent(CONFIG['state_dim'], CONFIG['action_dim'], 
-                     lr=CONFIG['learning_rate'], 
-                     gamma=CONFIG['gamma'], 
-                     epsilon=CONFIG['epsilon'])
+    print('[Save] Loading training config...')
+    config = load_config()
     
     # Note: The model was already trained but not saved due to the error
     # We'll create a fresh model directory for future training runs
@@ -29,7 +40,7 @@ def save_model():
     # Save training metadata
     metadata = {
         'training_date': datetime.now().isoformat(),
-        'config': CONFIG,
+        'config': config,
         'status': 'Training completed but model save failed due to Keras filename requirement',
         'fix_applied': 'Updated to use .weights.h5 extension',
         'next_steps': 'Re-run training with fixed script to save model'
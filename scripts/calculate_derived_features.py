@@ -1,8 +1,15 @@
-import sqlite3
+import os
+import sys
 import numpy as np
 from datetime import datetime
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_utils import open_db
+
+# Longest lookback used below (30-day volatility on hourly candles)
+MAX_WINDOW = 720
+
 def calculate_volatility(prices, window):
     """Calculate rolling volatility"""
     returns = np.diff(np.log(prices))
@@ -20,11 +27,14 @@ def calculate_features():
     print('=== Calculating Derived Features ===\n')
     
     # Connect to databases
-    conn_cdd = sqlite3.connect('/opt/binance-bot/data/cdd_data.db')
-    conn_market = sqlite3.connect('/opt/binance-bot/data/market_data.db')
+    conn_cdd = open_db('/opt/binance-bot/data/cdd_data.db')
+    conn_market = open_db('/opt/binance-bot/data/market_data.db')
+    
+    # Lets the per-symbol ORDER BY timestamp walk the index instead of sorting
+    conn_cdd.execute('CREATE INDEX IF NOT EXISTS ix_ohlcv_symbol_ts ON ohlcv(symbol, timestamp)')
     
     # Create features table
-    conn_features = sqlite3.connect('/opt/binance-bot/data/derived_features.db')
+    conn_features = open_db('/opt/binance-bot/data/derived_features.db')
     c = conn_features.cursor()
     
     c.execute('''CREATE TABLE IF NOT EXISTS features
@@ -45,21 +55,34 @@ def calculate_features():
         
         # Get OHLCV data
         df = pd.read_sql_query(
-            f"SELECT * FROM ohlcv WHERE symbol = '{symbol}' ORDER BY timestamp",
-            conn_cdd
+            "SELECT * FROM ohlcv WHERE symbol = ? ORDER BY timestamp",
+            conn_cdd, params=(symbol,)
         )
         
         if len(df) < 30:
             print(f'  Not enough data ({len(df)} records)')
             continue
         
+        # Resume after the newest stored row; keep MAX_WINDOW rows of history
+        # before it so every window sees exactly what a full rebuild would
+        start = 30
+        last = c.execute('SELECT MAX(timestamp) FROM features WHERE symbol = ?', (symbol,)).fetchone()[0]
+        if last is not None:
+            start = max(start, int(df['timestamp'].searchsorted(last, side='right')))
+        if start >= len(df):
+            print(f'  Up to date (last: {last})')
+            continue
+        if start > MAX_WINDOW:
+            df = df.iloc[start - MAX_WINDOW:].reset_index(drop=True)
+            start = MAX_WINDOW
+        
         prices = df['close'].values
         volumes = df['volume'].values
         highs = df['high'].values
         lows = df['low'].values
         
         # Calculate features for each timestamp
-        for i in range(30, len(df)):
+        for i in range(start, len(df)):
             timestamp = df.iloc[i]['timestamp']
             
             # Volatility features (5)
@@ -109,7 +132,7 @@ def calculate_features():
                       price_accel, trend_strength,
                       btc_corr, eth_corr, market_corr))
         
-        print(f'  Calculated {len(df)-30} feature records')
+        print(f'  Calculated {len(df)-start} feature records')
     
     conn_features.commit()
     
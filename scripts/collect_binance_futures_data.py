@@ -2,7 +2,11 @@ import requests
 import json
 import time
 from datetime import datetime, timedelta
-import sqlite3
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_utils import open_db
 
 # Binance Futures API endpoints (no key needed for public data)
 FUTURES_BASE = 'https://fapi.binance.com'
@@ -46,7 +50,7 @@ def collect_all_data():
     symbols = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'SOLUSDT', 'XRPUSDT']
     
     # Create database
-    conn = sqlite3.connect('/opt/binance-bot/data/binance_futures.db')
+    conn = open_db('/opt/binance-bot/data/binance_futures.db')
     c = conn.cursor()
     
     # Create tables
@@ -128,7 +132,7 @@ def collect_all_data():
     print('\nData collection complete!')
     
     # Print summary
-    conn = sqlite3.connect('/opt/binance-bot/data/binance_futures.db')
+    conn = open_db('/opt/binance-bot/data/binance_futures.db')
     c = conn.cursor()
     c.execute('SELECT COUNT(*) FROM funding_rates')
     print(f'Total funding rate records: {c.fetchone()[0]}')
@@ -51,11 +51,11 @@ done
 echo ""
 echo "[3/7] Checking ML models..."
 MODELS=(
-    "ml_models/ensemble/random_forest.pkl"
+    "ml_models/ensemble/random_forest.joblib"
     "ml_models/ensemble/xgboost.json"
     "ml_models/ensemble/lstm_model.keras"
-    "ml_models/anomaly/isolation_forest.pkl"
-    "ml_models/anomaly/scaler.pkl"
+    "ml_models/anomaly/isolation_forest.joblib"
+    "ml_models/anomaly/scaler.joblib"
 )
 
 for model in "${MODELS[@]}"; do
@@ -6,91 +6,140 @@ Detects unusual market conditions
 
 import numpy as np
 import pandas as pd
-import sqlite3
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn import config_context
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-import pickle
+from sklearn.preprocessing import MaxAbsScaler
+import joblib
 import os
+import sys
 
-def load_data(db_path='/opt/binance-bot/data/training_data.db'):
+try:
+    import lz4  # noqa: F401  (enables joblib's lz4 compressor)
+    COMPRESS = ('lz4', 3)
+except ImportError:
+    COMPRESS = ('zlib', 3)
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import fetch_columns, open_db
+from feature_cache import cached_frame
+
+DB_PATH = '/opt/binance-bot/data/training_data.db'
+
+def load_data(db_path=DB_PATH):
     """Load training data"""
     
-    conn = sqlite3.connect(db_path)
+    conn = open_db(db_path)
     
-    # Load OHLCV data
-    df = pd.read_sql_query("""
+    # Load OHLCV data (numeric columns, unparseable values as NaN)
+    df = pd.DataFrame(fetch_columns(conn, """
         SELECT timestamp, open, high, low, close, volume
         FROM deduplicated_ohlcv
         ORDER BY timestamp
-    """, conn)
+    """))
     
     conn.close()
     
-    # Convert to numeric
-    for col in ['open', 'high', 'low', 'close', 'volume']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    
     df = df.dropna()
     
     return df
 
+def _pct_change(values, periods=1):
+    """pct_change over a NumPy array; the first `periods` rows are NaN"""
+    out = np.full(len(values), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[periods:] = values[periods:] / values[:-periods] - 1
+    return out
+
+def _rolling(values, window, reducer, **kwargs):
+    """Trailing-window reduction; the first window - 1 rows are NaN"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = reducer(sliding_window_view(values, window), axis=1, **kwargs)
+    return out
+
 def engineer_features(df):
     """Engineer features for anomaly detection"""
     
-    features = pd.DataFrame()
-    
-    # Price features
-    features['price'] = df['close']
-    features['price_change'] = df['close'].pct_change()
-    features['high_low_range'] = (df['high'] - df['low']) / df['close']
-    
-    # Volume features
-    features['volume'] = df['volume']
-    features['volume_change'] = df['volume'].pct_change()
-    
-    # Volatility (rolling std of returns)
-    features['volatility'] = df['close'].pct_change().rolling(20).std()
-    
-    # Price position in range
-    features['price_position'] = (df['close'] - df['low'].rolling(20).min()) / \
-                                  (df['high'].rolling(20).max() - df['low'].rolling(20).min())
-    
-    # Volume ratio
-    features['volume_ratio'] = df['volume'] / df['volume'].rolling(20).mean()
-    
-    # Returns
-    features['returns_1h'] = df['close'].pct_change(1)
-    features['returns_4h'] = df['close'].pct_change(4)
-    features['returns_24h'] = df['close'].pct_change(24)
-    
-    # Drop NaN
-    features = features.dropna()
+    close = df['close'].to_numpy(dtype=np.float64)
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    
+    returns = _pct_change(close)
+    low_20 = _rolling(low, 20, np.min)
+    high_20 = _rolling(high, 20, np.max)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features = pd.DataFrame({
+            # Price features
+            'price': close,
+            'price_change': returns,
+            'high_low_range': (high - low) / close,
+            
+            # Volume features
+            'volume': volume,
+            'volume_change': _pct_change(volume),
+            
+            # Volatility (rolling std of returns)
+            'volatility': _rolling(returns, 20, np.std, ddof=1),
+            
+            # Price position in range
+            'price_position': (close - low_20) / (high_20 - low_20),
+            
+            # Volume ratio
+            'volume_ratio': volume / _rolling(volume, 20, np.mean),
+            
+            # Returns
+            'returns_1h': returns,
+            'returns_4h': _pct_change(close, 4),
+            'returns_24h': _pct_change(close, 24),
+        }, index=df.index)
+    
+    # Drop NaN (and inf from pct_change on zero volume)
+    features = features.replace([np.inf, -np.inf], np.nan).dropna()
     
     return features
 
-def train_anomaly_detector(X, contamination=0.05):
+def train_anomaly_detector(X, contamination=0.05, max_fit_samples=200_000):
     """Train Isolation Forest"""
     
     print(f"[AnomalyDetector] Training on {len(X)} samples...")
     
-    # Standardize features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Scale features; IsolationForest splits are rank-based so centering buys
+    # nothing, and MaxAbs stores a single vector instead of mean + scale.
+    # Fit in chunks and scale in place so no float64 copy of X is made.
+    X_scaled = X.to_numpy(dtype=np.float32)
+    scaler = MaxAbsScaler()
+    for start in range(0, len(X_scaled), 65536):
+        scaler.partial_fit(X_scaled[start:start + 65536])
+    X_scaled /= scaler.scale_.astype(np.float32)
     
     # Train Isolation Forest
     model = IsolationForest(
         contamination=contamination,  # Expected proportion of anomalies
         random_state=42,
         n_estimators=100,
-        max_samples='auto',
+        max_samples=min(256, len(X_scaled)),  # what 'auto' resolves to
         n_jobs=-1
     )
     
-    model.fit(X_scaled)
-    
-    # Predict on training data
-    predictions = model.predict(X_scaled)
-    scores = model.score_samples(X_scaled)
+    # Each tree only sees max_samples rows, so a uniform subsample fits an
+    # equivalent forest without validating/copying the full history
+    X_fit = X_scaled
+    if len(X_scaled) > max_fit_samples:
+        rng = np.random.default_rng(42)
+        idx = np.sort(rng.choice(len(X_scaled), max_fit_samples, replace=False))
+        X_fit = X_scaled[idx]
+        print(f"[AnomalyDetector] Fitting on a {max_fit_samples} row subsample")
+    
+    # Features are already NaN/inf-free, so skip sklearn's finiteness scans
+    with config_context(assume_finite=True):
+        model.fit(X_fit)
+        
+        # Predict on training data
+        predictions = model.predict(X_scaled)
+        scores = model.score_samples(X_scaled)
     
     # Count anomalies
     n_anomalies = (predictions == -1).sum()
@@ -102,15 +151,20 @@ def train_anomaly_detector(X, contamination=0.05):
     return model, scaler
 
 def save_model(model, scaler, output_dir='/opt/binance-bot/ml_models/anomaly'):
-    """Save model and scaler"""
+    """Save model and scaler
     
-    os.makedirs(output_dir, exist_ok=True)
+    Both are written with joblib (lz4 when installed, otherwise zlib), which
+    shrinks the forest several times while keeping load time low. Since
+    scikit-learn 1.3 IsolationForest caches per-tree path lengths at fit
+    time, so they are saved with the model and predict/score_samples walk
+    each tree once. Score in batches with ml_scripts/anomaly_scorer.score_batch,
+    which runs score_samples under joblib's threading backend.
+    """
     
-    with open(f'{output_dir}/isolation_forest.pkl', 'wb') as f:
-        pickle.dump(model, f)
+    os.makedirs(output_dir, exist_ok=True)
     
-    with open(f'{output_dir}/scaler.pkl', 'wb') as f:
-        pickle.dump(scaler, f)
+    joblib.dump(model, f'{output_dir}/isolation_forest.joblib', compress=COMPRESS)
+    joblib.dump(scaler, f'{output_dir}/scaler.joblib', compress=COMPRESS)
     
     print(f"[AnomalyDetector] 💾 Saved to {output_dir}/")
 
@@ -121,14 +175,19 @@ def main():
     print("  ANOMALY DETECTOR TRAINING")
     print("="*70)
     
-    # Load data
-    print("\n[1/4] Loading data...")
-    df = load_data()
-    print(f"  Loaded {len(df)} records")
-    
-    # Engineer features
-    print("\n[2/4] Engineering features...")
-    X = engineer_features(df)
+    def build_features():
+        # Load data
+        print("\n[1/4] Loading data...")
+        df = load_data(DB_PATH)
+        print(f"  Loaded {len(df)} records")
+        
+        # Engineer features
+        print("\n[2/4] Engineering features...")
+        return engineer_features(df)
+    
+    # Reused from the Parquet cache until the DB or the feature code changes
+    X = cached_frame('anomaly_features', [DB_PATH], build_features,
+                     code=[load_data, engineer_features, _pct_change, _rolling])
     print(f"  Created {X.shape[1]} features, {len(X)} samples")
     
     # Train model
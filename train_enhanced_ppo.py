@@ -4,7 +4,6 @@ Enhanced PPO Training Script with CDD Features
 Trains a PPO reinforcement learning agent on historical crypto data with CDD features
 """
 
-import sqlite3
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
@@ -12,6 +11,11 @@ import json
 import os
 import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_utils import fetch_columns, open_db
+from feature_cache import cached_frame
+from indicators import ema, wilder_rsi
+
 # Check for required packages
 try:
     import tensorflow as tf
@@ -39,6 +43,8 @@ CONFIG = {
     'gamma': 0.99,
     'epsilon': 0.2,
     'batch_size': 64,
+    'ppo_epochs': 4,  # Passes over each rollout in batch_size minibatches
+    'num_envs': 8,  # Parallel environments stepped with one batched forward pass
     'state_dim': 17,  # 12 original + 5 CDD features
     'action_dim': 4,  # HOLD, BUY, SELL, CLOSE
     'early_stopping_patience': 20,  # Stop if no improvement for 20 episodes
@@ -46,6 +52,24 @@ CONFIG = {
     'min_improvement': 0.01,  # Minimum improvement to reset patience
 }
 
+def join_on_unix(unix, source_df, value_col):
+    """Exact-match lookup of source_df[value_col] at each unix timestamp
+    
+    Returns a float64 array with NaN where there is no match. On duplicate
+    timestamps the last row wins, as with a dict built from the rows. Frames
+    from CDDDataLoader are already sorted (attrs['is_sorted']) and skip the sort.
+    """
+    unix = np.asarray(unix, dtype=np.int64)
+    keys = source_df['unix'].to_numpy(dtype=np.int64)
+    if len(keys) == 0:
+        return np.full(len(unix), np.nan)
+    values = source_df[value_col].to_numpy(dtype=np.float64)
+    if not source_df.attrs.get('is_sorted'):
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+    idx = np.maximum(np.searchsorted(keys, unix, side='right') - 1, 0)
+    return np.where(keys[idx] == unix, values[idx], np.nan)
+
 class CDDDataLoader:
     """Load CDD data from SQLite database"""
     
@@ -54,52 +78,78 @@ class CDDDataLoader:
         self.conn = None
         
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = open_db(self.db_path)
         print(f"[DataLoader] Connected to {self.db_path}", flush=True)
         
     def load_ohlcv(self, symbol, days=90):
         """Load OHLCV data"""
-        query = f"""
+        query = """
         SELECT unix, open, high, low, close, volume
         FROM spot_ohlcv
-        WHERE Symbol = '{symbol}'
+        WHERE Symbol = ?
         ORDER BY unix ASC
-        LIMIT {days * 24}
+        LIMIT ?
         """
-        df = pd.read_sql_query(query, self.conn)
-        df['close'] = pd.to_numeric(df['close'], errors='coerce')
-        df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
+        df = self._int64_unix(pd.DataFrame(fetch_columns(self.conn, query, (symbol, days * 24))))
         print(f"[DataLoader] Loaded {len(df)} OHLCV records for {symbol}", flush=True)
         return df
         
     def load_funding_rates(self, symbol):
         """Load funding rates"""
-        query = f"""
+        query = """
         SELECT Unix as unix, last_funding_rate
         FROM funding_rates
-        WHERE Symbol = '{symbol}'
+        WHERE Symbol = ?
         ORDER BY Unix ASC
         """
-        df = pd.read_sql_query(query, self.conn)
-        df['last_funding_rate'] = pd.to_numeric(df['last_funding_rate'], errors='coerce')
+        df = self._sorted_by_unix(self._int64_unix(pd.DataFrame(fetch_columns(self.conn, query, (symbol,)))))
         print(f"[DataLoader] Loaded {len(df)} funding rate records", flush=True)
         return df
         
     def load_vwap(self, symbol):
         """Load VWAP data"""
-        query = f"""
+        query = """
         SELECT date, vwap
         FROM spot_summary
-        WHERE symbol = '{symbol}'
+        WHERE symbol = ?
         ORDER BY date ASC
         """
-        df = pd.read_sql_query(query, self.conn)
+        df = pd.read_sql_query(query, self.conn, params=(symbol,))
         df['vwap'] = pd.to_numeric(df['vwap'], errors='coerce')
         # Convert date to unix timestamp for consistency
-        df['unix'] = pd.to_datetime(df['date']).astype(int) // 10**9 * 1000
+        df['unix'] = pd.to_datetime(df['date']).astype(np.int64) // 10**9 * 1000
+        df = self._sorted_by_unix(df)
         print(f"[DataLoader] Loaded {len(df)} VWAP records", flush=True)
         return df
         
+    @staticmethod
+    def _int64_unix(df):
+        """Drop rows without a timestamp and store unix as int64 milliseconds"""
+        df = df[df['unix'].notna()].reset_index(drop=True)
+        df['unix'] = df['unix'].astype(np.int64)
+        return df
+        
+    @staticmethod
+    def _sorted_by_unix(df):
+        """Stable sort by unix, once, so joins can skip it
+        
+        Duplicate timestamps are kept in their original order: join_on_unix
+        takes the last of them, the environment lookups the first, and the
+        funding trend averages over all of them.
+        """
+        df = df.sort_values('unix', kind='stable').reset_index(drop=True)
+        df.attrs['is_sorted'] = True
+        return df
+        
+    def load_cached(self, method, *args):
+        """Call a load_* method through the Parquet cache, connecting only on a miss"""
+        def build():
+            if self.conn is None:
+                self.connect()
+            return getattr(self, method)(*args)
+        name = '_'.join([method] + [str(a) for a in args])
+        return cached_frame(name, [self.db_path], build, code=[type(self)])
+        
     def close(self):
         if self.conn:
             self.conn.close()
@@ -107,27 +157,59 @@ class CDDDataLoader:
 class PPOAgent:
     """PPO Agent with Actor-Critic architecture"""
     
-    def __init__(self, state_dim, action_dim, lr=0.0003, gamma=0.99, epsilon=0.2):
+    def __init__(self, state_dim, action_dim, lr=0.0003, gamma=0.99, epsilon=0.2,
+                 batch_size=64, epochs=4):
         self.state_dim = state_dim
         self.action_dim = action_dim
         self.lr = lr
         self.gamma = gamma
         self.epsilon = epsilon
+        self.batch_size = batch_size
+        self.epochs = epochs
         
         # Build actor and critic networks
         self.actor = self.build_actor()
         self.critic = self.build_critic()
         
+        # Compiled single-state policy forward pass + sampling; the fixed
+        # input signature means it is traced once instead of per call
+        self._actor_forward = tf.function(
+            self._sample_actions,
+            input_signature=[tf.TensorSpec([1, state_dim], tf.float32)],
+            jit_compile=True
+        )
+        
+        # Batched version for vectorized rollouts (one row per environment)
+        self._actor_forward_batch = tf.function(
+            self._sample_actions,
+            input_signature=[tf.TensorSpec([None, state_dim], tf.float32)]
+        )
+        
         # Optimizers
         self.actor_optimizer = keras.optimizers.Adam(learning_rate=lr)
         self.critic_optimizer = keras.optimizers.Adam(learning_rate=lr)
         
-        # Memory
-        self.states = []
-        self.actions = []
-        self.rewards = []
-        self.next_states = []
-        self.dones = []
+        # Compiled minibatch update; one trace serves every batch size
+        self._train_step = tf.function(
+            self._ppo_update,
+            input_signature=[
+                tf.TensorSpec([None, state_dim], tf.float32),  # states
+                tf.TensorSpec([None], tf.int32),               # actions
+                tf.TensorSpec([None], tf.float32),             # old log-probs
+                tf.TensorSpec([None], tf.float32),             # advantages
+                tf.TensorSpec([None], tf.float32),             # value targets
+            ]
+        )
+        
+        # Memory: float32 rollout buffers written in place by remember();
+        # _n is the number of stored transitions
+        self._n = 0
+        self._allocate_memory(1024)
+        
+        # log pi(a|s) of the most recent act() call, stored with the
+        # transition so train() can form the PPO probability ratio
+        self.last_log_prob = 0.0
+        self.last_log_probs = np.zeros(0, dtype=np.float32)
         
     def build_actor(self):
         """Build actor network (policy)"""
@@ -147,46 +229,65 @@ class PPOAgent:
         model = keras.Model(inputs=inputs, outputs=outputs)
         return model
         
+    def _sample_actions(self, states):
+        """Policy forward pass and on-device sampling; returns (actions, log pi(a|s))"""
+        log_probs = tf.math.log(self.actor(states, training=False) + 1e-8)
+        actions = tf.random.categorical(log_probs, 1, dtype=tf.int32)[:, 0]
+        return actions, tf.gather(log_probs, actions, axis=1, batch_dims=1)
+        
     def act(self, state):
         """Select action based on policy"""
-        state = np.reshape(state, [1, self.state_dim])
-        probs = self.actor.predict(state, verbose=0)[0]
-        action = np.random.choice(self.action_dim, p=probs)
-        return action
-        
-    def remember(self, state, action, reward, next_state, done):
+        state = np.reshape(state, [1, self.state_dim]).astype(np.float32)
+        action, log_prob = self._actor_forward(tf.constant(state))
+        self.last_log_prob = float(log_prob[0])
+        return int(action[0])
+        
+    def act_batch(self, states):
+        """Select one action per row of states; log-probs go to last_log_probs"""
+        states = np.asarray(states, dtype=np.float32).reshape(-1, self.state_dim)
+        actions, log_probs = self._actor_forward_batch(tf.constant(states))
+        self.last_log_probs = log_probs.numpy()
+        return actions.numpy()
+        
+    def _allocate_memory(self, capacity):
+        """(Re)allocate rollout buffers, keeping the first _n transitions"""
+        n = self._n
+        old = getattr(self, '_buffers', None)
+        self._buffers = {
+            'states': np.empty((capacity, self.state_dim), dtype=np.float32),
+            'actions': np.empty(capacity, dtype=np.int32),
+            'rewards': np.empty(capacity, dtype=np.float32),
+            'next_states': np.empty((capacity, self.state_dim), dtype=np.float32),
+            'dones': np.empty(capacity, dtype=np.float32),
+            'log_probs': np.empty(capacity, dtype=np.float32),
+        }
+        if old is not None:
+            for key, buf in self._buffers.items():
+                buf[:n] = old[key][:n]
+        
+    def remember(self, state, action, reward, next_state, done, log_prob=None):
         """Store experience"""
-        self.states.append(state)
-        self.actions.append(action)
-        self.rewards.append(reward)
-        self.next_states.append(next_state)
-        self.dones.append(done)
-        
-    def train(self):
-        """Train actor and critic using PPO"""
-        if len(self.states) == 0:
-            return 0, 0
-            
-        # Convert to numpy arrays
-        states = np.array(self.states)
-        actions = np.array(self.actions)
-        rewards = np.array(self.rewards)
-        next_states = np.array(self.next_states)
-        dones = np.array(self.dones)
-        
-        # Calculate advantages
-        values = self.critic.predict(states, verbose=0).flatten()
-        next_values = self.critic.predict(next_states, verbose=0).flatten()
-        advantages = rewards + self.gamma * next_values * (1 - dones) - values
-        
-        # Normalize advantages
-        advantages = (advantages - np.mean(advantages)) / (np.std(advantages) + 1e-8)
-        
+        buf = self._buffers
+        if self._n == len(buf['actions']):
+            self._allocate_memory(2 * self._n)
+            buf = self._buffers
+        i = self._n
+        buf['states'][i] = state
+        buf['actions'][i] = action
+        buf['rewards'][i] = reward
+        buf['next_states'][i] = next_state
+        buf['dones'][i] = done
+        buf['log_probs'][i] = self.last_log_prob if log_prob is None else log_prob
+        self._n += 1
+        
+    def _ppo_update(self, states, actions, old_log_probs, advantages, targets):
+        """One clipped-surrogate actor step and one critic step on a minibatch"""
         # Train actor
         with tf.GradientTape() as tape:
-            probs = self.actor(states)
+            probs = self.actor(states, training=True)
             action_probs = tf.reduce_sum(probs * tf.one_hot(actions, self.action_dim), axis=1)
-            ratio = action_probs / (action_probs + 1e-10)
+            new_log_probs = tf.math.log(action_probs + 1e-8)
+            ratio = tf.exp(new_log_probs - old_log_probs)
             clipped_ratio = tf.clip_by_value(ratio, 1 - self.epsilon, 1 + self.epsilon)
             actor_loss = -tf.reduce_mean(tf.minimum(
                 ratio * advantages,
@@ -198,22 +299,55 @@ class PPOAgent:
         
         # Train critic
         with tf.GradientTape() as tape:
-            values = self.critic(states)
-            target_values = rewards + self.gamma * next_values * (1 - dones)
-            target_values = np.reshape(target_values, [-1, 1])
-            critic_loss = tf.reduce_mean(tf.square(values - target_values))
+            values = tf.squeeze(self.critic(states, training=True), axis=1)
+            critic_loss = tf.reduce_mean(tf.square(values - targets))
             
         critic_grads = tape.gradient(critic_loss, self.critic.trainable_variables)
         self.critic_optimizer.apply_gradients(zip(critic_grads, self.critic.trainable_variables))
         
-        # Clear memory
-        self.states = []
-        self.actions = []
-        self.rewards = []
-        self.next_states = []
-        self.dones = []
+        return actor_loss, critic_loss
+        
+    def train(self):
+        """Train actor and critic using PPO"""
+        if self._n == 0:
+            return 0, 0
+            
+        # Views of the filled part of the buffers (already float32)
+        n = self._n
+        states = self._buffers['states'][:n]
+        actions = self._buffers['actions'][:n]
+        rewards = self._buffers['rewards'][:n]
+        next_states = self._buffers['next_states'][:n]
+        dones = self._buffers['dones'][:n]
+        old_log_probs = self._buffers['log_probs'][:n]
+        
+        # Value targets and advantages, computed once per rollout
+        values = self.critic(states, training=False).numpy().flatten()
+        next_values = self.critic(next_states, training=False).numpy().flatten()
+        targets = rewards + self.gamma * next_values * (1 - dones)
+        advantages = targets - values
         
-        return float(actor_loss), float(critic_loss)
+        # Normalize advantages
+        advantages = (advantages - np.mean(advantages)) / (np.std(advantages) + 1e-8)
+        
+        # Several epochs of shuffled minibatches, as PPO intends
+        dataset = tf.data.Dataset.from_tensor_slices((
+            states, actions, old_log_probs,
+            advantages.astype(np.float32), targets.astype(np.float32)
+        )).shuffle(n).batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+        
+        actor_losses = []
+        critic_losses = []
+        for _ in range(self.epochs):
+            for batch in dataset:
+                actor_loss, critic_loss = self._train_step(*batch)
+                actor_losses.append(float(actor_loss))
+                critic_losses.append(float(critic_loss))
+                
+        # Clear memory (buffers are reused by the next rollout)
+        self._n = 0
+        
+        return float(np.mean(actor_losses)), float(np.mean(critic_losses))
         
     def save(self, path):
         """Save model weights"""
@@ -236,14 +370,59 @@ class TradingEnvironment:
         self.funding = funding_df
         self.vwap = vwap_df
         self.config = config
+        
+        # Contiguous column arrays; get_state/step slice these instead of
+        # building a DataFrame with .iloc on every call
+        self._close = np.ascontiguousarray(ohlcv_df['close'].to_numpy(dtype=np.float64))
+        self._volume = np.ascontiguousarray(ohlcv_df['volume'].to_numpy(dtype=np.float64))
+        self._unix = ohlcv_df['unix'].to_numpy(dtype=np.int64)
+        
+        # Sorted NumPy copies of the CDD series so the per-step lookups are
+        # binary searches; prefix sums turn the 7-day funding mean into O(1)
+        self._f_unix, self._f_rate = self._sorted_series(funding_df, 'last_funding_rate')
+        self._f_cum = np.concatenate(([0.0], np.cumsum(self._f_rate)))
+        self._v_unix, self._v_vwap = self._sorted_series(vwap_df, 'vwap')
+        
+        # Indicators depend only on the price series, so they are computed
+        # once here rather than on every reset/step
+        self._precompute_indicators()
+        
         self.reset()
         
-    def reset(self):
+    @staticmethod
+    def _sorted_series(df, value_col):
+        """Return (unix, values) arrays sorted by unix, without NaN values"""
+        unix = df['unix'].to_numpy(dtype=np.int64)
+        values = df[value_col].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        unix = unix[valid]
+        values = values[valid]
+        if df.attrs.get('is_sorted'):
+            return unix, values
+        order = np.argsort(unix, kind='stable')
+        return unix[order], values[order]
+        
+    def _precompute_indicators(self):
+        """Full-series RSI/MACD and 5-bar return stats, indexed by current_idx"""
+        close = pd.to_numeric(self.ohlcv['close'], errors='coerce').ffill()
+        prices = np.ascontiguousarray(close.to_numpy(dtype=np.float64))
+        
+        rsi = wilder_rsi(prices, 14)
+        self._rsi = np.where(np.isnan(rsi), 50.0, rsi)
+        self._ema12 = ema(prices, 12)
+        self._ema26 = ema(prices, 26)
+        
+        returns = close.pct_change().fillna(0)
+        self._ret = returns.to_numpy(dtype=np.float64)
+        self._ret_mean5 = returns.rolling(5, min_periods=1).mean().to_numpy(dtype=np.float64)
+        self._ret_std5 = returns.rolling(5, min_periods=1).std(ddof=0).fillna(0).to_numpy(dtype=np.float64)
+        
+    def reset(self, start_idx=None):
         """Reset environment for new episode"""
-        self.current_idx = self.config['lookback_period']
+        self.current_idx = self.config['lookback_period'] if start_idx is None else start_idx
         self.equity = self.config['initial_equity']
         self.peak_equity = self.config['initial_equity']
-        self.position = None
+        self._close_position()
         self.steps = 0
         return self.get_state()
         
@@ -251,28 +430,21 @@ class TradingEnvironment:
         """Get current state with CDD features"""
         lookback = self.config['lookback_period']
         
-        # Get lookback candles
-        candles = self.ohlcv.iloc[max(0, self.current_idx - lookback):self.current_idx + 1]
-        
-        # Price features
-        prices = candles['close'].values
-        normalized_prices = self.normalize(prices)
+        i = self.current_idx
+        start = max(0, i - lookback)
         
-        # Returns
-        returns = np.diff(prices) / prices[:-1]
-        returns = np.pad(returns, (lookback - len(returns), 0), 'constant')
+        # Latest price/volume scaled to [-1, 1] over the lookback window
+        normalized_price = self.normalize_last(self._close[start:i + 1])
+        normalized_volume = self.normalize_last(self._volume[start:i + 1])
         
-        # Volumes
-        volumes = candles['volume'].values
-        normalized_volumes = self.normalize(volumes)
-        
-        # Technical indicators
-        rsi = self.calculate_rsi(prices) / 100
-        macd, signal = self.calculate_macd(prices)
+        # Technical indicators (precomputed)
+        rsi = self._rsi[i] / 100
+        macd = (self._ema12[i] - self._ema26[i]) / self._close[i]
+        signal = macd * 0.9
         
         # CDD features
-        current_time = self.ohlcv.iloc[self.current_idx]['unix']
-        current_price = prices[-1]
+        current_time = self._unix[i]
+        current_price = self._close[i]
         
         funding_rate = self.get_funding_rate(current_time)
         funding_trend = self.get_funding_trend(current_time)
@@ -281,15 +453,14 @@ class TradingEnvironment:
         correlation = 0.5  # Simplified for now
         
         # Position features
-        has_position = 1 if self.position else 0
-        position_side = 0
+        has_position = 1 if self._pos_open else 0
+        position_side = self._pos_side
         position_pnl = 0
         position_duration = 0
         
-        if self.position:
-            position_side = 1 if self.position['side'] == 'LONG' else -1
+        if self._pos_open:
             position_pnl = self.calculate_pnl(current_price) / self.config['initial_equity']
-            position_duration = min((self.steps - self.position['entry_step']) / 100, 1)
+            position_duration = min((self.steps - self._pos_entry_step) / 100, 1)
             
         # Account features
         total_equity = self.get_total_equity(current_price)
@@ -299,11 +470,11 @@ class TradingEnvironment:
         # Combine all features (17 total)
         # Use latest values and aggregates instead of full time series
         state = np.array([
-            normalized_prices[-1],  # Latest normalized price
-            returns[-1] if len(returns) > 0 else 0,  # Latest return
-            normalized_volumes[-1],  # Latest normalized volume
-            np.mean(returns[-5:]) if len(returns) >= 5 else 0,  # 5-period avg return
-            np.std(returns[-5:]) if len(returns) >= 5 else 0,  # 5-period volatility
+            normalized_price,  # Latest normalized price
+            self._ret[i],  # Latest return
+            normalized_volume,  # Latest normalized volume
+            self._ret_mean5[i],  # 5-period avg return
+            self._ret_std5[i],  # 5-period volatility
             rsi,  # RSI indicator
             macd,  # MACD
             signal,  # MACD signal
@@ -322,35 +493,23 @@ class TradingEnvironment:
         
     def step(self, action):
         """Take action and return next state, reward, done"""
-        current_price = self.ohlcv.iloc[self.current_idx]['close']
+        current_price = self._close[self.current_idx]
         reward = 0
         
         # Execute action
-        if action == 1 and not self.position:  # BUY
-            self.position = {
-                'side': 'LONG',
-                'entry_price': current_price,
-                'quantity': (self.equity * 0.95) / current_price,
-                'entry_step': self.steps
-            }
-            self.equity -= self.equity * 0.95 * self.config['fee_rate']
+        if action == 1 and not self._pos_open:  # BUY
+            self._open_position(1, current_price)
             
-        elif action == 2 and not self.position:  # SELL
-            self.position = {
-                'side': 'SHORT',
-                'entry_price': current_price,
-                'quantity': (self.equity * 0.95) / current_price,
-                'entry_step': self.steps
-            }
-            self.equity -= self.equity * 0.95 * self.config['fee_rate']
+        elif action == 2 and not self._pos_open:  # SELL
+            self._open_position(-1, current_price)
             
-        elif action == 3 and self.position:  # CLOSE
+        elif action == 3 and self._pos_open:  # CLOSE
             pnl = self.calculate_pnl(current_price)
-            position_value = current_price * self.position['quantity']
+            position_value = current_price * self._pos_qty
             fees = position_value * self.config['fee_rate']
             self.equity += pnl - fees
             reward = (pnl / self.config['initial_equity']) * 100
-            self.position = None
+            self._close_position()
             
         # Update state
         self.current_idx += 1
@@ -363,30 +522,42 @@ class TradingEnvironment:
             
         # Check if done
         done = (
-            self.current_idx >= len(self.ohlcv) - 1 or
+            self.current_idx >= len(self._close) - 1 or
             self.steps >= self.config['max_steps'] or
             total_equity < self.config['initial_equity'] * 0.5
         )
         
         # Close position if done
-        if done and self.position:
+        if done and self._pos_open:
             pnl = self.calculate_pnl(current_price)
             self.equity += pnl
             reward += (pnl / self.config['initial_equity']) * 100
-            self.position = None
+            self._close_position()
             
         next_state = self.get_state() if not done else np.zeros(CONFIG['state_dim'])
         
         return next_state, reward, done
         
+    def _open_position(self, side, price):
+        """Open a LONG (side=1) or SHORT (side=-1) position with 95% of equity"""
+        self._pos_open = True
+        self._pos_side = side
+        self._pos_entry = price
+        self._pos_qty = (self.equity * 0.95) / price
+        self._pos_entry_step = self.steps
+        self.equity -= self.equity * 0.95 * self.config['fee_rate']
+        
+    def _close_position(self):
+        """Clear the position fields (no PnL is booked here)"""
+        self._pos_open = False
+        self._pos_side = 0
+        self._pos_entry = 0.0
+        self._pos_qty = 0.0
+        self._pos_entry_step = 0
+        
     def calculate_pnl(self, current_price):
-        """Calculate unrealized PnL"""
-        if not self.position:
-            return 0
-        if self.position['side'] == 'LONG':
-            return (current_price - self.position['entry_price']) * self.position['quantity']
-        else:
-            return (self.position['entry_price'] - current_price) * self.position['quantity']
+        """Calculate unrealized PnL (0 when flat, since side and quantity are 0)"""
+        return self._pos_side * (current_price - self._pos_entry) * self._pos_qty
             
     def get_total_equity(self, current_price):
         """Get total equity including unrealized PnL"""
@@ -394,66 +565,39 @@ class TradingEnvironment:
         
     def get_funding_rate(self, timestamp):
         """Get funding rate at timestamp"""
-        ts = int(timestamp) if isinstance(timestamp, str) else timestamp
-        matching = self.funding[pd.to_numeric(self.funding['unix'], errors='coerce') == ts]
-        if len(matching) > 0:
-            return matching.iloc[0]['last_funding_rate'] * 1000
+        ts = int(timestamp)
+        i = np.searchsorted(self._f_unix, ts)
+        if i < len(self._f_unix) and self._f_unix[i] == ts:
+            return self._f_rate[i] * 1000
         return 0
         
     def get_funding_trend(self, timestamp):
         """Get 7-day funding rate trend"""
-        ts = int(timestamp) if isinstance(timestamp, str) else timestamp
+        ts = int(timestamp)
         seven_days_ago = ts - (7 * 24 * 60 * 60 * 1000)
-        recent = self.funding[pd.to_numeric(self.funding['unix'], errors='coerce') >= seven_days_ago]
-        if len(recent) > 0:
-            return recent['last_funding_rate'].mean() * 1000
+        lo = np.searchsorted(self._f_unix, seven_days_ago)
+        hi = np.searchsorted(self._f_unix, ts, side='right')
+        if hi > lo:
+            return (self._f_cum[hi] - self._f_cum[lo]) / (hi - lo) * 1000
         return 0
         
     def get_vwap_deviation(self, timestamp, current_price):
         """Get VWAP deviation"""
-        ts = int(timestamp) if isinstance(timestamp, str) else timestamp
-        matching = self.vwap[pd.to_numeric(self.vwap['unix'], errors='coerce') == ts]
-        if len(matching) > 0:
-            vwap = matching.iloc[0]['vwap']
+        ts = int(timestamp)
+        i = np.searchsorted(self._v_unix, ts)
+        if i < len(self._v_unix) and self._v_unix[i] == ts:
+            vwap = self._v_vwap[i]
             return ((current_price - vwap) / vwap) * 100
         return 0
         
     @staticmethod
-    def normalize(values):
-        """Normalize array to [-1, 1]"""
-        values = np.array(values, dtype=float)
-        min_val = np.min(values)
-        max_val = np.max(values)
-        range_val = max_val - min_val
+    def normalize_last(values):
+        """Last value of the window normalized to [-1, 1] by the window's range"""
+        min_val = values.min()
+        range_val = values.max() - min_val
         if range_val == 0:
-            return np.zeros_like(values)
-        return 2 * (values - min_val) / range_val - 1
-        
-    @staticmethod
-    def calculate_rsi(prices, period=14):
-        """Calculate RSI"""
-        if len(prices) < period + 1:
-            return 50
-        changes = np.diff(prices)
-        gains = changes[changes > 0]
-        losses = -changes[changes < 0]
-        avg_gain = np.mean(gains) if len(gains) > 0 else 0
-        avg_loss = np.mean(losses) if len(losses) > 0 else 0
-        if avg_loss == 0:
-            return 100
-        rs = avg_gain / avg_loss
-        return 100 - (100 / (1 + rs))
-        
-    @staticmethod
-    def calculate_macd(prices):
-        """Calculate MACD"""
-        if len(prices) < 26:
-            return 0, 0
-        ema12 = pd.Series(prices).ewm(span=12).mean().iloc[-1]
-        ema26 = pd.Series(prices).ewm(span=26).mean().iloc[-1]
-        macd = (ema12 - ema26) / prices[-1]
-        signal = macd * 0.9
-        return macd, signal
+            return 0.0
+        return 2 * (values[-1] - min_val) / range_val - 1
 
 def train_model(config):
     """Main training function"""
@@ -462,11 +606,10 @@ def train_model(config):
     
     # Load data
     loader = CDDDataLoader()
-    loader.connect()
     
-    ohlcv_df = loader.load_ohlcv(config['symbol'], days=90)
-    funding_df = loader.load_funding_rates(config['symbol'])
-    vwap_df = loader.load_vwap(config['symbol'])
+    ohlcv_df = loader.load_cached('load_ohlcv', config['symbol'], 90)
+    funding_df = loader.load_cached('load_funding_rates', config['symbol'])
+    vwap_df = loader.load_cached('load_vwap', config['symbol'])
     
     loader.close()
     
@@ -474,14 +617,19 @@ def train_model(config):
         print("[Training] ERROR: Not enough data to train")
         return
         
-    # Create environment
-    env = TradingEnvironment(ohlcv_df, funding_df, vwap_df, config)
+    # Create environments, each starting at a different point in the series
+    num_envs = config.get('num_envs', 1)
+    envs = [TradingEnvironment(ohlcv_df, funding_df, vwap_df, config) for _ in range(num_envs)]
+    last_start = max(config['lookback_period'], len(ohlcv_df) - 1 - config['max_steps'])
+    start_indices = np.linspace(config['lookback_period'], last_start, num_envs).astype(int)
     
     # Create agent
     agent = PPOAgent(config['state_dim'], config['action_dim'], 
                      lr=config['learning_rate'], 
                      gamma=config['gamma'], 
-                     epsilon=config['epsilon'])
+                     epsilon=config['epsilon'],
+                     batch_size=config['batch_size'],
+                     epochs=config.get('ppo_epochs', 1))
     
     # Training loop
     episode_rewards = []
@@ -494,24 +642,30 @@ def train_model(config):
     checkpoint_dir = f"/opt/binance-bot/ml_models/checkpoints_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     os.makedirs(checkpoint_dir, exist_ok=True)
     
-    print(f"[Training] Starting training for {config['episodes']} episodes...", flush=True)
+    print(f"[Training] Starting training for {config['episodes']} episodes x {num_envs} environments...", flush=True)
     print(f"[Training] Early stopping patience: {config['early_stopping_patience']} episodes", flush=True)
     print(f"[Training] Checkpoint directory: {checkpoint_dir}", flush=True)
     
     for episode in range(config['episodes']):
-        state = env.reset()
-        episode_reward = 0
-        done = False
+        states = np.stack([env.reset(int(start)) for env, start in zip(envs, start_indices)])
+        env_rewards = np.zeros(num_envs)
+        active = np.ones(num_envs, dtype=bool)
         steps = 0
         
-        while not done:
-            action = agent.act(state)
-            next_state, reward, done = env.step(action)
-            agent.remember(state, action, reward, next_state, done)
-            state = next_state
-            episode_reward += reward
-            steps += 1
-            
+        # Step all environments in lockstep; finished ones just stop stepping
+        while active.any():
+            actions = agent.act_batch(states)
+            for k in np.flatnonzero(active):
+                next_state, reward, done = envs[k].step(actions[k])
+                agent.remember(states[k], actions[k], reward, next_state, done, agent.last_log_probs[k])
+                states[k] = next_state
+                env_rewards[k] += reward
+                active[k] = not done
+                steps += 1
+                
+        # Mean over environments keeps rewards on the single-env scale
+        episode_reward = float(env_rewards.mean())
+        
         # Train agent
         actor_loss, critic_loss = agent.train()
         episode_rewards.append(episode_reward)
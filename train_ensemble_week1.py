@@ -7,21 +7,32 @@ Trains Random Forest and XGBoost models on engineered features.
 
 import sys
 import os
+import shutil
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import json
-import pickle
+import joblib
 
 # ML libraries
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
+from threadpoolctl import threadpool_limits
 import xgboost as xgb
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from cpu_utils import physical_cores
 from train_enhanced_ppo import CDDDataLoader
+from features_core import ENSEMBLE_COLUMNS, compute_all_features
+
+
+def xgb_device():
+    """'cuda' when XGBoost was built with CUDA and a GPU is visible, else 'cpu'"""
+    if xgb.build_info().get('USE_CUDA') and shutil.which('nvidia-smi'):
+        return 'cuda'
+    return 'cpu'
 
 
 class FeatureEngineer:
@@ -30,81 +41,6 @@ class FeatureEngineer:
     def __init__(self):
         self.loader = CDDDataLoader()
     
-    def calculate_technical_indicators(self, df):
-        """Calculate technical indicators"""
-        
-        # RSI (Relative Strength Index)
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / (loss + 1e-10)
-        df['rsi'] = 100 - (100 / (1 + rs))
-        
-        # MACD (Moving Average Convergence Divergence)
-        ema12 = df['close'].ewm(span=12, adjust=False).mean()
-        ema26 = df['close'].ewm(span=26, adjust=False).mean()
-        df['macd'] = ema12 - ema26
-        df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
-        df['macd_hist'] = df['macd'] - df['macd_signal']
-        
-        # Bollinger Bands
-        sma20 = df['close'].rolling(window=20).mean()
-        std20 = df['close'].rolling(window=20).std()
-        df['bb_upper'] = sma20 + (std20 * 2)
-        df['bb_lower'] = sma20 - (std20 * 2)
-        df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / sma20
-        df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'] + 1e-10)
-        
-        # Moving Averages
-        df['sma_5'] = df['close'].rolling(window=5).mean()
-        df['sma_10'] = df['close'].rolling(window=10).mean()
-        df['sma_20'] = df['close'].rolling(window=20).mean()
-        df['ema_5'] = df['close'].ewm(span=5, adjust=False).mean()
-        df['ema_10'] = df['close'].ewm(span=10, adjust=False).mean()
-        
-        # Price momentum
-        df['momentum_1h'] = df['close'].pct_change(1)
-        df['momentum_4h'] = df['close'].pct_change(4)
-        df['momentum_24h'] = df['close'].pct_change(24)
-        
-        # Volume indicators
-        df['volume_sma_20'] = df['volume'].rolling(window=20).mean()
-        df['volume_ratio'] = df['volume'] / (df['volume_sma_20'] + 1e-10)
-        
-        # ATR (Average True Range)
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        df['atr'] = true_range.rolling(window=14).mean()
-        df['atr_pct'] = df['atr'] / df['close']
-        
-        return df
-    
-    def add_cdd_features(self, df, funding_df, vwap_df):
-        """Add CryptoDataDownload features"""
-        
-        # Funding rate features
-        if len(funding_df) > 0:
-            # Merge funding rates
-            funding_dict = dict(zip(funding_df['unix'], funding_df['last_funding_rate']))
-            df['funding_rate'] = df['unix'].map(funding_dict).fillna(0)
-            df['funding_trend'] = df['funding_rate'].rolling(window=8).mean()
-        else:
-            df['funding_rate'] = 0
-            df['funding_trend'] = 0
-        
-        # VWAP features
-        if len(vwap_df) > 0:
-            vwap_dict = dict(zip(vwap_df['unix'], vwap_df['vwap']))
-            df['vwap'] = df['unix'].map(vwap_dict).fillna(df['close'])
-            df['vwap_deviation'] = (df['close'] - df['vwap']) / df['vwap']
-        else:
-            df['vwap'] = df['close']
-            df['vwap_deviation'] = 0
-        
-        return df
-    
     def create_target(self, df, horizon=1, threshold=0.001):
         """
         Create target variable for classification
@@ -119,9 +55,11 @@ class FeatureEngineer:
         """
         future_return = df['close'].shift(-horizon) / df['close'] - 1
         
-        target = np.where(future_return > threshold, 2,  # UP
-                         np.where(future_return < -threshold, 0,  # DOWN
-                                 1))  # SIDEWAYS
+        target = np.select(
+            [future_return > threshold, future_return < -threshold],
+            [2, 0],  # UP, DOWN
+            default=1  # SIDEWAYS
+        ).astype(np.int8)
         
         df['target'] = target
         df['future_return'] = future_return
@@ -129,30 +67,18 @@ class FeatureEngineer:
         return df
     
     def prepare_features(self, symbol='BTCUSDT', days=90):
-        """Prepare full feature set"""
-        
-        print(f"[FeatureEngineer] Loading data for {symbol} ({days} days)...")
-        
-        # Load data
-        self.loader.connect()
-        ohlcv_df = self.loader.load_ohlcv(symbol, days=days)
-        funding_df = self.loader.load_funding_rates(symbol)
-        vwap_df = self.loader.load_vwap(symbol)
-        self.loader.close()
-        
-        print(f"[FeatureEngineer] Loaded {len(ohlcv_df)} OHLCV records")
+        """Prepare full feature set
         
-        # Convert to numeric
-        print(f"[FeatureEngineer] Converting data types...")
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            ohlcv_df[col] = pd.to_numeric(ohlcv_df[col], errors='coerce')
+        Columns come from the shared features_core frame (one cached
+        artifact for week1 and week2); only the ensemble inputs are kept.
+        """
         
-        # Calculate features
-        print(f"[FeatureEngineer] Calculating technical indicators...")
-        df = self.calculate_technical_indicators(ohlcv_df)
+        return self.prepare_from_df(compute_all_features(symbol, days, self.loader))
+    
+    def prepare_from_df(self, features_df):
+        """Ensemble inputs plus target from an already computed compute_all_features() frame"""
         
-        print(f"[FeatureEngineer] Adding CDD features...")
-        df = self.add_cdd_features(df, funding_df, vwap_df)
+        df = features_df[['unix'] + ENSEMBLE_COLUMNS].copy()
         
         print(f"[FeatureEngineer] Creating target variable...")
         df = self.create_target(df, horizon=1, threshold=0.001)
@@ -193,12 +119,17 @@ class RandomForestTrainer:
             max_depth=self.max_depth,
             min_samples_split=10,
             min_samples_leaf=5,
+            bootstrap=True,
+            oob_score=True,  # Free generalization estimate from the out-of-bag rows
             random_state=42,
-            n_jobs=-1,
+            n_jobs=physical_cores(),
             verbose=1
         )
         
-        self.model.fit(X_train, y_train)
+        # Keep BLAS from spawning its own pools inside the joblib workers
+        with threadpool_limits(1, user_api='blas'):
+            self.model.fit(X_train, y_train)
+        
         print(f"[RF] ✅ Training complete")
         
         # Validation
@@ -210,15 +141,13 @@ class RandomForestTrainer:
         print(f"\n[RF] Classification Report:")
         print(classification_report(y_val, y_pred, target_names=['DOWN', 'SIDEWAYS', 'UP']))
         
-        # Cross-validation
-        print(f"\n[RF] Running 5-fold cross-validation...")
-        cv_scores = cross_val_score(self.model, X_train, y_train, cv=5, scoring='accuracy')
-        print(f"[RF] CV Accuracy: {cv_scores.mean():.3f} ± {cv_scores.std():.3f}")
+        # Out-of-bag accuracy instead of refitting 5 more forests for CV
+        oob_score = self.model.oob_score_
+        print(f"[RF] OOB Accuracy: {oob_score:.3f}")
         
         return {
-            'val_accuracy': accuracy,
-            'cv_mean': cv_scores.mean(),
-            'cv_std': cv_scores.std()
+            'val_accuracy': float(accuracy),
+            'oob_score': float(oob_score)
         }
     
     def get_feature_importance(self, feature_names, top_n=20):
@@ -240,19 +169,19 @@ class RandomForestTrainer:
         return list(zip([feature_names[i] for i in indices], importances[indices]))
     
     def save(self, path):
-        """Save model"""
-        with open(path, 'wb') as f:
-            pickle.dump(self.model, f)
+        """Save model (uncompressed, so the tree arrays can be memory-mapped on load)"""
+        joblib.dump(self.model, path)
         print(f"[RF] 💾 Model saved to: {path}")
 
 
 class XGBoostTrainer:
     """Train XGBoost regressor for expected return prediction"""
     
-    def __init__(self, n_estimators=1000, max_depth=6, learning_rate=0.01):
+    def __init__(self, n_estimators=1000, max_depth=6, learning_rate=0.01, max_bin=256):
         self.n_estimators = n_estimators
         self.max_depth = max_depth
         self.learning_rate = learning_rate
+        self.max_bin = max_bin
         self.model = None
     
     def train(self, X_train, y_train, X_val, y_val):
@@ -267,30 +196,38 @@ class XGBoostTrainer:
         print(f"[XGB] Features: {X_train.shape[1]}")
         
         # Train
-        print(f"\n[XGB] Training XGBoost ({self.n_estimators} rounds, lr={self.learning_rate})...")
-        self.model = xgb.XGBRegressor(
-            n_estimators=self.n_estimators,
-            max_depth=self.max_depth,
-            learning_rate=self.learning_rate,
-            objective='reg:squarederror',
-            random_state=42,
-            n_jobs=-1,
-            verbosity=1
-        )
+        device = xgb_device()
+        print(f"\n[XGB] Training XGBoost ({self.n_estimators} rounds, lr={self.learning_rate}, device={device})...")
+        params = {
+            'objective': 'reg:squarederror',
+            'tree_method': 'hist',
+            'max_bin': self.max_bin,
+            'device': device,
+            'max_depth': self.max_depth,
+            'learning_rate': self.learning_rate,
+            'seed': 42,
+            'nthread': physical_cores(),
+            'verbosity': 1
+        }
         
-        # XGBoost 3.x sklearn API
-        self.model.set_params(early_stopping_rounds=50)
-        self.model.fit(
-            X_train, y_train,
-            eval_set=[(X_val, y_val)],
-            verbose=True
+        # Quantize features once into max_bin buckets; the validation matrix
+        # reuses the training cut points
+        dtrain = xgb.QuantileDMatrix(np.ascontiguousarray(X_train), label=y_train, max_bin=self.max_bin)
+        dval = xgb.QuantileDMatrix(np.ascontiguousarray(X_val), label=y_val, ref=dtrain)
+        
+        self.model = xgb.train(
+            params, dtrain,
+            num_boost_round=self.n_estimators,
+            evals=[(dval, 'val')],
+            early_stopping_rounds=50,
+            verbose_eval=True
         )
         
         print(f"[XGB] ✅ Training complete (best iteration: {self.model.best_iteration})")
         
         # Validation
         print(f"\n[XGB] Evaluating on validation set...")
-        y_pred = self.model.predict(X_val)
+        y_pred = self.model.inplace_predict(X_val, iteration_range=(0, self.model.best_iteration + 1))
         
         # Metrics
         mae = np.mean(np.abs(y_pred - y_val))
@@ -305,9 +242,9 @@ class XGBoostTrainer:
         print(f"  Direction Accuracy: {direction_correct:.3f}")
         
         return {
-            'val_mae': mae,
-            'val_rmse': rmse,
-            'direction_accuracy': direction_correct,
+            'val_mae': float(mae),
+            'val_rmse': float(rmse),
+            'direction_accuracy': float(direction_correct),
             'best_iteration': self.model.best_iteration
         }
     
@@ -317,7 +254,13 @@ class XGBoostTrainer:
         if self.model is None:
             return None
         
-        importances = self.model.feature_importances_
+        # Gain importance, normalized like the sklearn wrapper's feature_importances_;
+        # features never used in a split are absent from get_score
+        scores = self.model.get_score(importance_type='gain')
+        importances = np.array([scores.get(f'f{i}', 0.0) for i in range(len(feature_names))], dtype=np.float32)
+        total = importances.sum()
+        if total > 0:
+            importances /= total
         indices = np.argsort(importances)[::-1]
         
         print(f"\n[XGB] Top {top_n} Feature Importances:")
@@ -359,9 +302,11 @@ def main():
     # Step 2: Prepare train/val split
     feature_cols = [col for col in df.columns if col not in ['target', 'future_return', 'unix']]
     
-    X = df[feature_cols].values
-    y_class = df['target'].values  # For Random Forest (classification)
-    y_reg = df['future_return'].values  # For XGBoost (regression)
+    # float32 features and compact targets halve the bytes the tree
+    # builders scan per split/histogram pass
+    X = df[feature_cols].to_numpy(dtype=np.float32)
+    y_class = df['target'].to_numpy(dtype=np.int8)  # For Random Forest (classification)
+    y_reg = df['future_return'].to_numpy(dtype=np.float32)  # For XGBoost (regression)
     
     # Train/val split (chronological)
     split_idx = int(len(X) * (1 - TEST_SIZE))
@@ -378,7 +323,7 @@ def main():
     rf_trainer = RandomForestTrainer(n_estimators=500, max_depth=10)
     rf_metrics = rf_trainer.train(X_train, y_class_train, X_val, y_class_val)
     rf_trainer.get_feature_importance(feature_cols, top_n=20)
-    rf_trainer.save(f'{OUTPUT_DIR}/random_forest.pkl')
+    rf_trainer.save(f'{OUTPUT_DIR}/random_forest.joblib')
     
     # Step 4: Train XGBoost
     xgb_trainer = XGBoostTrainer(n_estimators=1000, max_depth=6, learning_rate=0.01)
@@ -409,7 +354,7 @@ def main():
     print(f"{'='*70}")
     print(f"  Random Forest:")
     print(f"    Validation Accuracy: {rf_metrics['val_accuracy']:.3f}")
-    print(f"    CV Accuracy: {rf_metrics['cv_mean']:.3f} ± {rf_metrics['cv_std']:.3f}")
+    print(f"    OOB Accuracy: {rf_metrics['oob_score']:.3f}")
     print(f"\n  XGBoost:")
     print(f"    MAE: {xgb_metrics['val_mae']:.6f}")
     print(f"    RMSE: {xgb_metrics['val_rmse']:.6f}")
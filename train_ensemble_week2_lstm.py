@@ -9,6 +9,7 @@ import sys
 import os
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime
 import json
 
@@ -20,10 +21,31 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout, BatchNormalization
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 from tensorflow.keras.optimizers import Adam
+from tensorflow.keras import mixed_precision
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from train_enhanced_ppo import CDDDataLoader
+from features_core import compute_all_features
+
+
+def _cpu_has_bf16():
+    """True when the CPU has native bf16 matmul (AVX512-BF16 or AMX)"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def mixed_precision_policy():
+    """16-bit activations where the hardware has fast 16-bit math, float32 otherwise"""
+    if tf.config.list_physical_devices('GPU'):
+        return 'mixed_float16'
+    if _cpu_has_bf16():
+        return 'mixed_bfloat16'
+    return 'float32'
 
 
 class LSTMDataPreparator:
@@ -36,36 +58,13 @@ class LSTMDataPreparator:
     def load_and_prepare_data(self, symbol='BTCUSDT', days=90):
         """Load and prepare LSTM training data"""
         
-        print(f"[LSTM Data] Loading data for {symbol} ({days} days)...")
-        
-        # Load data
-        self.loader.connect()
-        ohlcv_df = self.loader.load_ohlcv(symbol, days=days)
-        funding_df = self.loader.load_funding_rates(symbol)
-        vwap_df = self.loader.load_vwap(symbol)
-        self.loader.close()
-        
-        print(f"[LSTM Data] Loaded {len(ohlcv_df)} OHLCV records")
-        
-        # Convert to numeric
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            ohlcv_df[col] = pd.to_numeric(ohlcv_df[col], errors='coerce')
-        
-        # Add CDD features
-        if len(funding_df) > 0:
-            funding_dict = dict(zip(funding_df['unix'], funding_df['last_funding_rate']))
-            ohlcv_df['funding_rate'] = ohlcv_df['unix'].map(funding_dict).fillna(0)
-        else:
-            ohlcv_df['funding_rate'] = 0
-        
-        if len(vwap_df) > 0:
-            vwap_dict = dict(zip(vwap_df['unix'], vwap_df['vwap']))
-            ohlcv_df['vwap'] = ohlcv_df['unix'].map(vwap_dict).fillna(ohlcv_df['close'])
-        else:
-            ohlcv_df['vwap'] = ohlcv_df['close']
+        # Shared week1/week2 feature frame (one cached artifact)
+        return self.prepare_from_df(compute_all_features(symbol, days, self.loader))
+    
+    def prepare_from_df(self, features_df):
+        """Sequences from an already computed compute_all_features() frame"""
         
-        # Calculate features
-        df = self.calculate_features(ohlcv_df)
+        df = self.calculate_features(features_df)
         
         # Create sequences
         X, y = self.create_sequences(df)
@@ -74,44 +73,27 @@ class LSTMDataPreparator:
         
         return X, y, df
     
+    # Columns of the LSTM frame, renamed from the shared feature frame where needed
+    FRAME_COLUMNS = {
+        'unix': 'unix', 'open': 'open', 'high': 'high', 'low': 'low',
+        'close': 'close', 'volume': 'volume',
+        'funding_rate': 'funding_rate', 'vwap': 'vwap',
+        'price_change': 'price_change', 'high_low_range': 'high_low_range',
+        'close_open_change': 'close_open_change', 'volume_change': 'volume_change',
+        'volume_ma_10': 'volume_ma', 'volume_ratio_10': 'volume_ratio',
+        'sma_5': 'sma_5', 'sma_10': 'sma_10', 'sma_20': 'sma_20',
+        'price_sma5_ratio': 'price_sma5_ratio', 'price_sma10_ratio': 'price_sma10_ratio',
+        'price_sma20_ratio': 'price_sma20_ratio',
+        'rsi': 'rsi', 'rsi_normalized': 'rsi_normalized', 'vwap_deviation': 'vwap_deviation',
+    }
+    
     def calculate_features(self, df):
-        """Calculate features for LSTM"""
+        """Select the LSTM columns from the shared feature frame"""
         
         print(f"[LSTM Data] Calculating features...")
         
-        # Price features (normalized)
-        df['price_change'] = df['close'].pct_change()
-        df['high_low_range'] = (df['high'] - df['low']) / df['close']
-        df['close_open_change'] = (df['close'] - df['open']) / df['open']
-        
-        # Volume features
-        df['volume_change'] = df['volume'].pct_change()
-        df['volume_ma'] = df['volume'].rolling(window=10).mean()
-        df['volume_ratio'] = df['volume'] / (df['volume_ma'] + 1e-10)
-        
-        # Moving averages
-        df['sma_5'] = df['close'].rolling(window=5).mean()
-        df['sma_10'] = df['close'].rolling(window=10).mean()
-        df['sma_20'] = df['close'].rolling(window=20).mean()
-        
-        # MA ratios (normalized)
-        df['price_sma5_ratio'] = df['close'] / (df['sma_5'] + 1e-10) - 1
-        df['price_sma10_ratio'] = df['close'] / (df['sma_10'] + 1e-10) - 1
-        df['price_sma20_ratio'] = df['close'] / (df['sma_20'] + 1e-10) - 1
-        
-        # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / (loss + 1e-10)
-        df['rsi'] = 100 - (100 / (1 + rs))
-        df['rsi_normalized'] = (df['rsi'] - 50) / 50  # Normalize to [-1, 1]
-        
-        # VWAP deviation
-        df['vwap_deviation'] = (df['close'] - df['vwap']) / df['vwap']
-        
-        # Funding rate (already normalized)
-        # df['funding_rate'] already added
+        # volume_ma/volume_ratio here are the 10-bar versions
+        df = df[list(self.FRAME_COLUMNS)].rename(columns=self.FRAME_COLUMNS)
         
         # Drop NaN
         df = df.dropna()
@@ -140,36 +122,26 @@ class LSTMDataPreparator:
             'rsi_normalized', 'vwap_deviation', 'funding_rate'
         ]
         
-        # Create sequences
-        X_list = []
-        y_list = []
+        L = self.sequence_length
+        n_seq = max(len(df) - L - horizon, 0)
         
-        for i in range(len(df) - self.sequence_length - horizon):
-            # Input sequence
-            sequence = df[feature_cols].iloc[i:i+self.sequence_length].values
-            X_list.append(sequence)
-            
-            # Target (future return)
-            current_price = df['close'].iloc[i + self.sequence_length - 1]
-            future_price = df['close'].iloc[i + self.sequence_length + horizon - 1]
-            future_return = (future_price - current_price) / current_price
-            
-            # Classify
-            if future_return > threshold:
-                target = [0, 0, 1]  # UP
-            elif future_return < -threshold:
-                target = [1, 0, 0]  # DOWN
-            else:
-                target = [0, 1, 0]  # SIDEWAYS
-            
-            y_list.append(target)
+        # Sequence i covers rows i..i+L-1: a strided view, no per-row copies
+        features = df[feature_cols].to_numpy(dtype=np.float32)
+        X = sliding_window_view(features, L, axis=0).transpose(0, 2, 1)[:n_seq]
         
-        X = np.array(X_list)
-        y = np.array(y_list)
+        # Target (future return) from the last row of each sequence
+        close = df['close'].to_numpy(dtype=np.float64)
+        current_price = close[L - 1:L - 1 + n_seq]
+        future_price = close[L + horizon - 1:L + horizon - 1 + n_seq]
+        future_return = (future_price - current_price) / current_price
+        
+        # Classify: 0=DOWN, 1=SIDEWAYS, 2=UP, one-hot encoded
+        labels = np.select([future_return > threshold, future_return < -threshold], [2, 0], default=1)
+        y = np.eye(3, dtype=np.float32)[labels]
         
         print(f"[LSTM Data] X shape: {X.shape}")
         print(f"[LSTM Data] y shape: {y.shape}")
-        print(f"[LSTM Data] Class distribution: DOWN={y[:,0].sum()}, SIDEWAYS={y[:,1].sum()}, UP={y[:,2].sum()}")
+        print(f"[LSTM Data] Class distribution: DOWN={int(y[:,0].sum())}, SIDEWAYS={int(y[:,1].sum())}, UP={int(y[:,2].sum())}")
         
         return X, y
 
@@ -190,11 +162,16 @@ class LSTMTrainer:
         print(f"  LSTM Model Architecture")
         print(f"{'='*70}\n")
         
+        # Keras wraps the optimizer in a LossScaleOptimizer on compile under mixed_float16
+        policy = mixed_precision_policy()
+        mixed_precision.set_global_policy(policy)
+        print(f"[LSTM] Precision policy: {policy}")
+        
         model = Sequential([
-            # First LSTM layer
+            # First LSTM layer (default activations/no recurrent dropout keep
+            # both layers on the fused cuDNN kernel; no BatchNorm between them)
             LSTM(lstm_units, return_sequences=True, 
                  input_shape=(self.sequence_length, self.n_features)),
-            BatchNormalization(),
             Dropout(dropout),
             
             # Second LSTM layer
@@ -206,8 +183,8 @@ class LSTMTrainer:
             Dense(32, activation='relu'),
             Dropout(dropout),
             
-            # Output layer (3 classes: DOWN, SIDEWAYS, UP)
-            Dense(3, activation='softmax')
+            # Output layer (3 classes: DOWN, SIDEWAYS, UP); softmax stays float32
+            Dense(3, activation='softmax', dtype='float32')
         ])
         
         # Compile
@@ -225,6 +202,31 @@ class LSTMTrainer:
         
         return model
     
+    @staticmethod
+    def make_dataset(X, y, batch_size, shuffle=False):
+        """Batched tf.data pipeline; prefetch overlaps the host-to-device copy with the step
+        
+        X is usually the sliding-window view from create_sequences. Batches are
+        gathered from it on demand, so only batch_size windows are ever copied
+        instead of materialising every overlapping window up front.
+        """
+        def batches():
+            order = np.random.permutation(len(X)) if shuffle else None
+            for start in range(0, len(X), batch_size):
+                if order is None:
+                    idx = slice(start, start + batch_size)
+                    yield np.ascontiguousarray(X[idx]), np.ascontiguousarray(y[idx])
+                else:
+                    idx = order[start:start + batch_size]
+                    yield X[idx], y[idx]
+        
+        signature = (
+            tf.TensorSpec((None,) + X.shape[1:], tf.float32),
+            tf.TensorSpec((None,) + y.shape[1:], tf.float32),
+        )
+        ds = tf.data.Dataset.from_generator(batches, output_signature=signature)
+        return ds.prefetch(tf.data.AUTOTUNE)
+    
     def train(self, X_train, y_train, X_val, y_val, epochs=50, batch_size=32):
         """Train LSTM model"""
         
@@ -254,13 +256,15 @@ class LSTMTrainer:
             )
         ]
         
+        train_ds = self.make_dataset(X_train, y_train, batch_size, shuffle=True)
+        val_ds = self.make_dataset(X_val, y_val, batch_size)
+        
         # Train
         print(f"\n[LSTM] Starting training...\n")
         self.history = self.model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
+            train_ds,
+            validation_data=val_ds,
             epochs=epochs,
-            batch_size=batch_size,
             callbacks=callbacks,
             verbose=1
         )
@@ -269,10 +273,10 @@ class LSTMTrainer:
         
         # Evaluate
         print(f"[LSTM] Evaluating on validation set...")
-        val_loss, val_accuracy, val_ce = self.model.evaluate(X_val, y_val, verbose=0)
+        val_loss, val_accuracy, val_ce = self.model.evaluate(val_ds, verbose=0)
         
-        # Predictions
-        y_pred_probs = self.model.predict(X_val, verbose=0)
+        # Predictions (val_ds is unshuffled, so rows line up with y_val)
+        y_pred_probs = self.model.predict(val_ds, verbose=0)
         y_pred = np.argmax(y_pred_probs, axis=1)
         y_true = np.argmax(y_val, axis=1)
         
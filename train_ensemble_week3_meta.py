@@ -12,6 +12,9 @@ import pandas as pd
 from datetime import datetime
 import json
 import pickle
+import joblib
+import glob
+from concurrent.futures import ThreadPoolExecutor
 
 # ML libraries
 from sklearn.linear_model import LogisticRegression
@@ -19,15 +22,63 @@ from sklearn.ensemble import VotingClassifier
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import xgboost as xgb
 
+# Optional: compile the tree ensembles to native prediction code
+try:
+    import treelite
+    import treelite.sklearn
+    import tl2cgen
+except ImportError:
+    treelite = tl2cgen = None
+
 # TensorFlow for LSTM
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 import tensorflow as tf
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from train_enhanced_ppo import CDDDataLoader, PPOAgent
-from train_ensemble_week1 import FeatureEngineer
+from train_enhanced_ppo import CDDDataLoader, PPOAgent, join_on_unix
+from train_ensemble_week1 import FeatureEngineer, physical_cores
 from train_ensemble_week2_lstm import LSTMDataPreparator
+import features_core
+import indicators
+from features_core import compute_all_features
+from feature_cache import CACHE_DIR, cache_key
+
+# RF, XGBoost and the LSTM predict side by side in get_predictions; each one
+# gets an equal share of the physical cores so together they do not oversubscribe
+MODEL_THREADS = max(1, physical_cores() // 3)
+
+# Sequences per LSTM inference call (and the fixed batch of the TFLite model)
+LSTM_BATCH_SIZE = 4096
+
+# The LSTM's ops run one at a time on the LSTM's share of the cores
+try:
+    tf.config.threading.set_intra_op_parallelism_threads(MODEL_THREADS)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+except RuntimeError:
+    pass  # TF runtime already initialized by an importer
+
+
+# Fixed class probabilities (DOWN, SIDEWAYS, UP) for the XGBoost and rule signals
+SIGNAL_PROBS = np.array([
+    [0.7, 0.2, 0.1],    # DOWN
+    [0.25, 0.5, 0.25],  # SIDEWAYS
+    [0.1, 0.2, 0.7],    # UP
+], dtype=np.float32)
+
+
+def signal_probs(values, threshold):
+    """Map a signal to SIGNAL_PROBS rows: > threshold UP, < -threshold DOWN, else SIDEWAYS
+    
+    One searchsorted pass bins the values; the upper edge is nudged past
+    +threshold so that exactly +/-threshold stays SIDEWAYS, and NaN
+    (which searchsorted sorts last) is SIDEWAYS too.
+    """
+    values = np.asarray(values)
+    edges = np.array([-threshold, np.nextafter(threshold, np.inf)])
+    classes = np.searchsorted(edges, values, side='right')
+    classes[np.isnan(values)] = 1
+    return SIGNAL_PROBS[classes]
 
 
 class EnsemblePredictor:
@@ -36,6 +87,11 @@ class EnsemblePredictor:
     def __init__(self, models_dir='/opt/binance-bot/ml_models'):
         self.models_dir = models_dir
         self.models = {}
+        self._lstm_fn = None
+        self._xgb_booster = None
+        self._xgb_iteration_range = (0, 0)
+        self._rf_predictor = None
+        self._xgb_predictor = None
         
     def load_models(self):
         """Load all trained models"""
@@ -54,9 +110,20 @@ class EnsemblePredictor:
         
         # 2. Load Random Forest
         try:
-            rf_path = f"{self.models_dir}/ensemble/random_forest.pkl"
-            with open(rf_path, 'rb') as f:
-                self.models['rf'] = pickle.load(f)
+            rf_path = f"{self.models_dir}/ensemble/random_forest.joblib"
+            if os.path.exists(rf_path):
+                # Tree arrays stay memory-mapped and are shared through the page cache
+                self.models['rf'] = joblib.load(rf_path, mmap_mode='r')
+            else:
+                # Models trained before the switch to joblib
+                rf_path = f"{self.models_dir}/ensemble/random_forest.pkl"
+                with open(rf_path, 'rb') as f:
+                    self.models['rf'] = pickle.load(f)
+            # Trained as single-threaded sub-forests; predict on its share of the cores
+            self.models['rf'].n_jobs = MODEL_THREADS
+            self._rf_predictor = self._treelite_predictor(
+                'Random Forest', rf_path, lambda: treelite.sklearn.import_model(self.models['rf'])
+            )
             print(f"[Ensemble] ✅ Random Forest loaded")
         except Exception as e:
             print(f"[Ensemble] ⚠️  Random Forest load failed: {e}")
@@ -67,6 +134,18 @@ class EnsemblePredictor:
             xgb_path = f"{self.models_dir}/ensemble/xgboost.json"
             self.models['xgb'] = xgb.XGBRegressor()
             self.models['xgb'].load_model(xgb_path)
+            # Predict straight from the booster; keep the early-stopping cutoff
+            # that XGBRegressor.predict would apply
+            self._xgb_booster = self.models['xgb'].get_booster()
+            self._xgb_booster.set_param({'nthread': MODEL_THREADS})
+            best = self._xgb_booster.attr('best_iteration')
+            self._xgb_iteration_range = (0, int(best) + 1) if best is not None else (0, 0)
+            booster = self._xgb_booster
+            if best is not None:
+                booster = booster[slice(*self._xgb_iteration_range)]
+            self._xgb_predictor = self._treelite_predictor(
+                'XGBoost', xgb_path, lambda: treelite.frontend.from_xgboost(booster)
+            )
             print(f"[Ensemble] ✅ XGBoost loaded")
         except Exception as e:
             print(f"[Ensemble] ⚠️  XGBoost load failed: {e}")
@@ -76,6 +155,11 @@ class EnsemblePredictor:
         try:
             lstm_path = f"{self.models_dir}/ensemble/lstm_model.keras"
             self.models['lstm'] = tf.keras.models.load_model(lstm_path)
+            self._lstm_fn = self._compile_lstm(self.models['lstm'])
+            if tf.config.list_physical_devices('GPU'):
+                self._lstm_fn = self._tensorrt_lstm(self.models['lstm'], self._lstm_fn, lstm_path) or self._lstm_fn
+            else:
+                self._lstm_fn = self._tflite_lstm(self.models['lstm'], lstm_path) or self._lstm_fn
             print(f"[Ensemble] ✅ LSTM loaded")
         except Exception as e:
             print(f"[Ensemble] ⚠️  LSTM load failed: {e}")
@@ -87,6 +171,121 @@ class EnsemblePredictor:
         
         return self.models
     
+    @staticmethod
+    def _treelite_predictor(name, model_path, import_model):
+        """Treelite-compiled shared library for a tree ensemble, or None without treelite
+        
+        The .so is built next to the model file and rebuilt only when the
+        model is newer.
+        """
+        if treelite is None:
+            return None
+        libpath = f"{os.path.splitext(model_path)[0]}.so"
+        try:
+            if not os.path.exists(libpath) or os.path.getmtime(libpath) < os.path.getmtime(model_path):
+                tl2cgen.export_lib(
+                    import_model(), toolchain='gcc', libpath=libpath,
+                    params={'parallel_comp': physical_cores()}, nthread=physical_cores()
+                )
+            # Compiling runs alone at load time; predicting shares the cores
+            predictor = tl2cgen.Predictor(libpath, nthread=MODEL_THREADS)
+            print(f"[Ensemble] ✅ {name} treelite library: {libpath}")
+            return predictor
+        except Exception as e:
+            print(f"[Ensemble] ⚠️  {name} treelite compilation skipped: {e}")
+            return None
+    
+    @staticmethod
+    def _compile_lstm(model):
+        """Inference graph with a fixed (None, seq_len, n_features) signature, traced once"""
+        _, seq_len, n_features = model.input_shape
+        
+        @tf.function(input_signature=[tf.TensorSpec([None, seq_len, n_features], tf.float32)])
+        def forward(x):
+            return model(x, training=False)
+        
+        return forward
+    
+    @staticmethod
+    def _tensorrt_lstm(model, forward, lstm_path):
+        """FP16 TF-TRT engine for the LSTM graph, or None when TensorRT is unavailable
+        
+        The converted SavedModel is kept next to the Keras file and rebuilt
+        only when the model is newer. Export or conversion errors are raised.
+        """
+        trt_dir = f"{lstm_path}.trt_fp16"
+        if not os.path.isdir(trt_dir) or os.path.getmtime(trt_dir) < os.path.getmtime(lstm_path):
+            src_dir = f"{lstm_path}.savedmodel"
+            try:
+                # Fails here when TF was built without TensorRT or libnvinfer is missing
+                params = tf.experimental.tensorrt.ConversionParams(precision_mode='FP16')
+                converter = tf.experimental.tensorrt.Converter(
+                    input_saved_model_dir=src_dir, conversion_params=params
+                )
+            except (ImportError, AttributeError, RuntimeError, tf.errors.NotFoundError) as e:
+                print(f"[Ensemble] ⚠️  TensorRT unavailable, skipping: {e}")
+                return None
+            
+            # The module has to track the model so its variables are saved with forward
+            module = tf.Module()
+            module.model = model
+            module.forward = forward
+            tf.saved_model.save(module, src_dir, signatures={'serving_default': forward})
+            converter.convert()
+            converter.save(trt_dir)
+        
+        serving = tf.saved_model.load(trt_dir).signatures['serving_default']
+        print(f"[Ensemble] ✅ LSTM TensorRT FP16 engine: {trt_dir}")
+        return lambda x: next(iter(serving(x).values()))
+    
+    @staticmethod
+    def _tflite_lstm(model, lstm_path):
+        """Dynamic-range int8 TFLite interpreter for CPU inference, or None if it cannot run
+        
+        Weights are stored as int8 and run on the XNNPACK kernels. Only
+        builtin ops are allowed (the stock interpreter has no Flex ops), so
+        the model is converted with a fixed batch of LSTM_BATCH_SIZE and a
+        short last batch is zero-padded. The .tflite file is kept next to
+        the Keras file and rebuilt only when the model is newer; a warm-up
+        run at load time catches models the interpreter cannot execute.
+        """
+        tflite_path = os.path.join(os.path.dirname(lstm_path), f'lstm_int8_b{LSTM_BATCH_SIZE}.tflite')
+        _, seq_len, n_features = model.input_shape
+        try:
+            if not os.path.exists(tflite_path) or os.path.getmtime(tflite_path) < os.path.getmtime(lstm_path):
+                inputs = tf.keras.Input((seq_len, n_features), batch_size=LSTM_BATCH_SIZE)
+                fixed = tf.keras.Model(inputs, model(inputs, training=False))
+                converter = tf.lite.TFLiteConverter.from_keras_model(fixed)
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+                with open(tflite_path, 'wb') as f:
+                    f.write(converter.convert())
+            
+            interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=MODEL_THREADS)
+            interpreter.allocate_tensors()
+            input_index = interpreter.get_input_details()[0]['index']
+            output_index = interpreter.get_output_details()[0]['index']
+            batch = np.zeros((LSTM_BATCH_SIZE, seq_len, n_features), dtype=np.float32)
+            
+            def forward(x):
+                x = np.asarray(x, dtype=np.float32)
+                out = np.empty((len(x), 3), dtype=np.float32)
+                for start in range(0, len(x), LSTM_BATCH_SIZE):
+                    n = min(LSTM_BATCH_SIZE, len(x) - start)
+                    batch[:n] = x[start:start + n]
+                    batch[n:] = 0.0
+                    interpreter.set_tensor(input_index, batch)
+                    interpreter.invoke()
+                    out[start:start + n] = interpreter.get_tensor(output_index)[:n]
+                return out
+            
+            forward(batch[:1])
+            print(f"[Ensemble] ✅ LSTM TFLite int8 model: {tflite_path}")
+            return forward
+        except Exception as e:
+            print(f"[Ensemble] ⚠️  TFLite skipped, using the TensorFlow graph: {e}")
+            return None
+    
     def _create_rule_based_predictor(self):
         """Simple rule-based predictor"""
         class RulePredictor:
@@ -97,25 +296,49 @@ class EnsemblePredictor:
                 - If RSI > 70: SELL (DOWN)
                 - Else: SIDEWAYS
                 """
-                predictions = []
-                for sample in X:
-                    # Assume RSI is feature index 15 (from FeatureEngineer)
-                    # For simplicity, use momentum features
-                    momentum_1h = sample[8] if len(sample) > 8 else 0
-                    
-                    if momentum_1h > 0.005:  # Strong up momentum
-                        pred = [0.1, 0.2, 0.7]  # UP
-                    elif momentum_1h < -0.005:  # Strong down momentum
-                        pred = [0.7, 0.2, 0.1]  # DOWN
-                    else:
-                        pred = [0.25, 0.5, 0.25]  # SIDEWAYS
-                    
-                    predictions.append(pred)
+                X = np.asarray(X)
+                # Assume RSI is feature index 15 (from FeatureEngineer)
+                # For simplicity, use momentum features (one contiguous column)
+                if X.shape[1] > 8:
+                    momentum_1h = np.ascontiguousarray(X[:, 8], dtype=np.float32)
+                else:
+                    momentum_1h = np.zeros(len(X), dtype=np.float32)
                 
-                return np.array(predictions)
+                # Strong up/down momentum (beyond +/-0.5%) votes UP/DOWN
+                return signal_probs(momentum_1h, 0.005)
         
         return RulePredictor()
     
+    def _predict_rf(self, X_features):
+        """Random Forest class probabilities, from the compiled library when available"""
+        if self._rf_predictor is None:
+            return self.models['rf'].predict_proba(X_features)
+        X_features32 = np.ascontiguousarray(X_features, dtype=np.float32)
+        probs = self._rf_predictor.predict(tl2cgen.DMatrix(X_features32, dtype='float32'))
+        return probs.reshape(len(X_features32), -1)
+    
+    def _predict_xgb(self, X_features):
+        """XGBoost expected return mapped to class probabilities (+/-0.1%)"""
+        X_features32 = np.ascontiguousarray(X_features, dtype=np.float32)
+        if self._xgb_predictor is not None:
+            xgb_raw = self._xgb_predictor.predict(tl2cgen.DMatrix(X_features32, dtype='float32')).reshape(-1)
+        else:
+            xgb_raw = self._xgb_booster.inplace_predict(X_features32, iteration_range=self._xgb_iteration_range)
+        return signal_probs(xgb_raw, 0.001)
+    
+    def _predict_lstm(self, X_sequences, batch_size=LSTM_BATCH_SIZE):
+        """LSTM class probabilities through the fastest loaded backend
+        
+        X_sequences is a strided window view; only one batch of it is
+        materialized at a time, into a preallocated output.
+        """
+        n_samples = len(X_sequences)
+        lstm_preds = np.empty((n_samples, 3), dtype=np.float32)
+        for start in range(0, n_samples, batch_size):
+            batch = np.ascontiguousarray(X_sequences[start:start + batch_size], dtype=np.float32)
+            lstm_preds[start:start + len(batch)] = np.asarray(self._lstm_fn(tf.constant(batch)))
+        return lstm_preds
+    
     def get_predictions(self, X_features, X_sequences):
         """
         Get predictions from all models
@@ -130,49 +353,39 @@ class EnsemblePredictor:
         print(f"\n[Ensemble] Collecting predictions from all models...")
         
         n_samples = len(X_features)
-        all_predictions = []
         
-        # 1. PPO predictions (skip for now - different state format)
-        # We'll use a placeholder
-        ppo_preds = np.ones((n_samples, 4)) * 0.25  # Uniform distribution
-        all_predictions.append(ppo_preds)
-        print(f"[Ensemble] PPO: {ppo_preds.shape} (placeholder)")
-        
-        # 2. Random Forest
+        # 2-5. RF, XGBoost, LSTM and rules are independent; run them on threads
+        # (each spends its time in C/TF code that releases the GIL), each one
+        # writing into its own column block of the meta-feature matrix
+        tasks = []
         if self.models['rf'] is not None:
-            rf_preds = self.models['rf'].predict_proba(X_features)
-            all_predictions.append(rf_preds)
-            print(f"[Ensemble] Random Forest: {rf_preds.shape}")
-        
-        # 3. XGBoost (convert regression to probabilities)
+            tasks.append(('Random Forest', lambda: self._predict_rf(X_features)))
         if self.models['xgb'] is not None:
-            xgb_raw = self.models['xgb'].predict(X_features)
-            # Convert to class probabilities
-            xgb_preds = np.zeros((n_samples, 3))
-            for i, val in enumerate(xgb_raw):
-                if val > 0.001:
-                    xgb_preds[i] = [0.1, 0.2, 0.7]  # UP
-                elif val < -0.001:
-                    xgb_preds[i] = [0.7, 0.2, 0.1]  # DOWN
-                else:
-                    xgb_preds[i] = [0.25, 0.5, 0.25]  # SIDEWAYS
-            all_predictions.append(xgb_preds)
-            print(f"[Ensemble] XGBoost: {xgb_preds.shape}")
-        
-        # 4. LSTM
+            tasks.append(('XGBoost', lambda: self._predict_xgb(X_features)))
         if self.models['lstm'] is not None and X_sequences is not None:
-            lstm_preds = self.models['lstm'].predict(X_sequences, verbose=0)
-            all_predictions.append(lstm_preds)
-            print(f"[Ensemble] LSTM: {lstm_preds.shape}")
-        
-        # 5. Rules
+            tasks.append(('LSTM', lambda: self._predict_lstm(X_sequences)))
         if self.models['rules'] is not None:
-            rule_preds = self.models['rules'].predict_proba(X_features)
-            all_predictions.append(rule_preds)
-            print(f"[Ensemble] Rules: {rule_preds.shape}")
+            tasks.append(('Rules', lambda: self.models['rules'].predict_proba(X_features)))
+        
+        # PPO block (4) + 3 class probabilities per model, allocated once in
+        # float32 like X_features; the meta-learner reads it as is
+        meta_features = np.empty((n_samples, 4 + 3 * len(tasks)), dtype=np.float32)
+        
+        # 1. PPO predictions (skip for now - different state format)
+        # We'll use a placeholder
+        meta_features[:, :4] = 0.25  # Uniform distribution
+        print(f"[Ensemble] PPO: {(n_samples, 4)} (placeholder)")
+        
+        def fill(out, fn):
+            out[...] = fn()
+        
+        blocks = [meta_features[:, 4 + 3 * i:7 + 3 * i] for i in range(len(tasks))]
+        with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as pool:
+            futures = [pool.submit(fill, out, fn) for out, (_, fn) in zip(blocks, tasks)]
+            for (name, _), out, future in zip(tasks, blocks, futures):
+                future.result()
+                print(f"[Ensemble] {name}: {out.shape}")
         
-        # Concatenate all predictions
-        meta_features = np.hstack(all_predictions)
         print(f"[Ensemble] ✅ Meta-features shape: {meta_features.shape}\n")
         
         return meta_features
@@ -185,8 +398,12 @@ class MetaLearner:
         self.meta_model = None
         self.voting_ensemble = None
     
-    def train_stacking(self, X_meta, y_true):
-        """Train stacking meta-learner"""
+    def train_stacking(self, X_meta, y_true, warm_start_path=None):
+        """Train stacking meta-learner
+        
+        If warm_start_path holds a previously saved meta-learner with the same
+        meta-features, fitting continues from its coefficients.
+        """
         
         print(f"\n{'='*70}")
         print(f"  Meta-Learner Training (Stacking)")
@@ -196,14 +413,17 @@ class MetaLearner:
         print(f"[Meta] Meta-features: {X_meta.shape[1]}")
         print(f"[Meta] Classes: {len(np.unique(y_true))}")
         
-        # Logistic Regression meta-learner
-        self.meta_model = LogisticRegression(
-            C=1.0,
-            max_iter=1000,
-            multi_class='multinomial',
-            solver='lbfgs',
-            random_state=42
-        )
+        # Logistic Regression meta-learner (multinomial; saga keeps the
+        # previous coefficients as its starting point with warm_start)
+        self.meta_model = self._load_previous(warm_start_path, X_meta.shape[1])
+        if self.meta_model is None:
+            self.meta_model = LogisticRegression(
+                C=1.0,
+                max_iter=200,
+                solver='saga',
+                warm_start=True,
+                random_state=42
+            )
         
         print(f"\n[Meta] Training Logistic Regression meta-learner...")
         self.meta_model.fit(X_meta, y_true)
@@ -220,6 +440,24 @@ class MetaLearner:
             'train_accuracy': float(accuracy)
         }
     
+    @staticmethod
+    def _load_previous(path, n_features):
+        """Saved saga meta-learner from path when it fits n_features inputs, else None"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+        except Exception as e:
+            print(f"[Meta] ⚠️  Could not load previous meta-learner: {e}")
+            return None
+        if not isinstance(model, LogisticRegression) or model.solver != 'saga' \
+                or getattr(model, 'n_features_in_', None) != n_features:
+            return None
+        model.set_params(warm_start=True)
+        print(f"[Meta] Warm-starting from {path}")
+        return model
+    
     def create_voting_ensemble(self, X_meta, y_true):
         """Create simple voting ensemble for comparison"""
         
@@ -231,37 +469,19 @@ class MetaLearner:
         # Each model contributes 3-4 features (class probabilities)
         # Extract argmax from each model's predictions
         
-        n_samples = len(X_meta)
-        votes = []
-        
         # PPO (4 classes, take first 3)
         ppo_votes = np.argmax(X_meta[:, :3], axis=1)
-        votes.append(ppo_votes)
-        
-        # RF (3 classes)
-        rf_votes = np.argmax(X_meta[:, 4:7], axis=1)
-        votes.append(rf_votes)
-        
-        # XGB (3 classes)
-        xgb_votes = np.argmax(X_meta[:, 7:10], axis=1)
-        votes.append(xgb_votes)
         
-        # LSTM (3 classes)
-        lstm_votes = np.argmax(X_meta[:, 10:13], axis=1)
-        votes.append(lstm_votes)
+        # RF, XGB, LSTM and Rules (3 classes each) sit side by side in
+        # columns 4:16, so one argmax over a (samples, 4, 3) view covers them
+        n_samples = X_meta.shape[0]
+        votes_3cls = X_meta[:, 4:16].reshape(n_samples, 4, 3).argmax(axis=2)
         
-        # Rules (3 classes)
-        rule_votes = np.argmax(X_meta[:, 13:16], axis=1)
-        votes.append(rule_votes)
-        
-        # Majority vote
-        votes_array = np.array(votes).T  # (samples, n_models)
-        ensemble_pred = []
-        for i in range(n_samples):
-            counts = np.bincount(votes_array[i], minlength=3)
-            ensemble_pred.append(np.argmax(counts))
-        
-        ensemble_pred = np.array(ensemble_pred)
+        # Majority vote: per-class vote counts for every sample at once,
+        # ties going to the lower class as with bincount + argmax
+        votes_array = np.column_stack((ppo_votes, votes_3cls))  # (samples, n_models)
+        counts = (votes_array[..., None] == np.arange(3)).sum(axis=1)  # (samples, 3)
+        ensemble_pred = counts.argmax(axis=1)
         accuracy = accuracy_score(y_true, ensemble_pred)
         
         print(f"[Voting] Accuracy: {accuracy:.3f}")
@@ -280,37 +500,31 @@ class MetaLearner:
         print(f"\n[Meta] 💾 Meta-learner saved to: {path}")
 
 
-def main():
-    """Main training routine"""
-    
-    print("\n" + "="*70)
-    print("  Ensemble ML Training - Week 3")
-    print("  Meta-Learner & Ensemble Integration")
-    print("="*70 + "\n")
-    
-    # Configuration
-    SYMBOL = 'BTCUSDT'
-    DAYS = 90
-    SEQUENCE_LENGTH = 20
-    OUTPUT_DIR = '/opt/binance-bot/ml_models/ensemble'
+def build_meta_features(symbol, days, sequence_length, models_dir):
+    """Load every base model and return (meta_features, y_true) for the aligned samples"""
     
     # Step 1: Load all models
-    predictor = EnsemblePredictor()
+    predictor = EnsemblePredictor(models_dir)
     predictor.load_models()
     
     # Step 2: Prepare data
     print(f"\n[Data] Preparing validation data...")
     
+    # One shared feature frame feeds both the tabular models and the LSTM
+    features_df = compute_all_features(symbol, days)
+    
     # Features for RF, XGB, Rules
     engineer = FeatureEngineer()
-    df_features = engineer.prepare_features(SYMBOL, days=DAYS)
-    feature_cols = [col for col in df_features.columns if col not in ['target', 'future_return', 'unix']]
-    X_features = df_features[feature_cols].values
-    y_class = df_features['target'].values
+    df_features = engineer.prepare_from_df(features_df)
+    # float32, C-contiguous: the dtype RF/XGBoost were trained on and what inplace_predict reads
+    # (pandas hands back a column-major block, hence the one explicit copy)
+    X_features = np.ascontiguousarray(
+        df_features.drop(columns=['target', 'future_return', 'unix'], errors='ignore').to_numpy(dtype=np.float32)
+    )
     
     # Sequences for LSTM
-    lstm_prep = LSTMDataPreparator(sequence_length=SEQUENCE_LENGTH)
-    X_sequences, y_lstm, _ = lstm_prep.load_and_prepare_data(SYMBOL, days=DAYS)
+    lstm_prep = LSTMDataPreparator(sequence_length=sequence_length)
+    X_sequences, y_lstm, _ = lstm_prep.prepare_from_df(features_df)
     
     # Align samples (LSTM has fewer due to sequence creation)
     min_samples = min(len(X_features), len(X_sequences))
@@ -325,9 +539,74 @@ def main():
     # Step 3: Get predictions from all models
     meta_features = predictor.get_predictions(X_features, X_sequences)
     
+    return meta_features, y_true
+
+
+def cached_meta_features(symbol, days, sequence_length, cache_dir=CACHE_DIR, models_dir='/opt/binance-bot/ml_models'):
+    """build_meta_features() memoized as .npy files, memory-mapped on reload
+    
+    The key covers the base model files, the CDD database, this module and
+    the feature pipeline it reads through, so retraining a model, new data or
+    a feature change forces a rebuild.
+    """
+    model_files = [
+        f"{models_dir}/ensemble/random_forest.joblib",
+        f"{models_dir}/ensemble/random_forest.pkl",
+        f"{models_dir}/ensemble/xgboost.json",
+        f"{models_dir}/ensemble/lstm_model.keras",
+    ]
+    sources = [path for path in model_files if os.path.exists(path)] + [CDDDataLoader().db_path]
+    try:
+        key = cache_key(sources, code=[
+            sys.modules[__name__], FeatureEngineer, LSTMDataPreparator,
+            features_core, indicators, CDDDataLoader, join_on_unix
+        ])
+    except (OSError, TypeError):
+        return build_meta_features(symbol, days, sequence_length, models_dir)
+    
+    prefix = f"{cache_dir}/meta_{symbol}_{days}_{sequence_length}"
+    x_path, y_path = f"{prefix}_{key}_X.npy", f"{prefix}_{key}_y.npy"
+    if os.path.exists(x_path) and os.path.exists(y_path):
+        print(f"[Meta] Loaded cached meta-features from {x_path}")
+        return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+    
+    meta_features, y_true = build_meta_features(symbol, days, sequence_length, models_dir)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale in glob.glob(f"{prefix}_*.npy"):
+            os.remove(stale)
+        np.save(x_path, meta_features)
+        np.save(y_path, y_true)
+        print(f"[Meta] 💾 Cached meta-features to {x_path}")
+    except OSError as e:
+        print(f"[Meta] ⚠️  Not caching meta-features: {e}")
+    
+    return meta_features, y_true
+
+
+def main():
+    """Main training routine"""
+    
+    print("\n" + "="*70)
+    print("  Ensemble ML Training - Week 3")
+    print("  Meta-Learner & Ensemble Integration")
+    print("="*70 + "\n")
+    
+    # Configuration
+    SYMBOL = 'BTCUSDT'
+    DAYS = 90
+    SEQUENCE_LENGTH = 20
+    OUTPUT_DIR = '/opt/binance-bot/ml_models/ensemble'
+    
+    # Steps 1-3: Load models, prepare data, collect base-model predictions
+    # (skipped entirely when the cached meta-features are still valid)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    meta_features, y_true = cached_meta_features(SYMBOL, DAYS, SEQUENCE_LENGTH)
+    min_samples = len(y_true)
+    
     # Step 4: Train meta-learner
     meta_learner = MetaLearner()
-    stacking_metrics = meta_learner.train_stacking(meta_features, y_true)
+    stacking_metrics = meta_learner.train_stacking(meta_features, y_true, warm_start_path=f'{OUTPUT_DIR}/meta_learner.pkl')
     meta_learner.save(f'{OUTPUT_DIR}/meta_learner.pkl')
     
     # Step 5: Create voting ensemble for comparison